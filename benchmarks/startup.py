@@ -0,0 +1,106 @@
+"""
+Benchmark of the command line startup. It imports the modules that the waypaper entry
+point needs in fresh interpreters, checks that they do not pull in GUI or imaging
+libraries, and that they fit the time budget. Nothing is run, so the wallpaper, the
+backends and the state file are left alone.
+Usage: python benchmarks/startup.py [--budget SECONDS] [--runs N]
+"""
+
+import os
+import ast
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Modules that only the GUI and thumbnailing need:
+HEAVY_MODULES = ["gi", "PIL", "imageio", "imageio_ffmpeg", "numpy", "screeninfo"]
+
+# Import the modules, as the entry point would before parsing arguments, and report:
+PROBE = """
+import sys, json, time, importlib
+start = time.perf_counter()
+for name in {modules}:
+    importlib.import_module(name)
+heavy = [name for name in {heavy} if name in sys.modules]
+print(json.dumps({{"time": time.perf_counter() - start, "heavy": heavy}}), file=sys.stderr)
+"""
+
+
+def get_entry_modules() -> list[str]:
+    """Get the modules that waypaper/__main__.py imports at the top level"""
+    tree = ast.parse((ROOT / "waypaper" / "__main__.py").read_text())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return modules
+
+
+def measure(modules: list[str]) -> tuple[float, list[str]]:
+    """Import the modules in a new interpreter and return the import time and heavy imports"""
+    probe = PROBE.format(modules=modules, heavy=HEAVY_MODULES)
+
+    # Keep the user's configuration out of reach, in case some module reads it on import:
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(
+            os.environ,
+            PYTHONPATH=str(ROOT),
+            HOME=home,
+            XDG_CONFIG_HOME=home,
+            XDG_STATE_HOME=home,
+            XDG_CACHE_HOME=home,
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", probe],
+            env=env,
+            cwd=ROOT,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+    lines = result.stderr.strip().splitlines()
+    try:
+        report = json.loads(lines[-1])
+    except (IndexError, json.JSONDecodeError):
+        raise RuntimeError(f"Importing {', '.join(modules)} failed:\n{result.stderr}")
+    return report["time"], report["heavy"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check waypaper CLI startup time.")
+    parser.add_argument("--budget", type=float, default=0.15, help="seconds per command")
+    parser.add_argument("--runs", type=int, default=5, help="runs of each command")
+    args = parser.parse_args()
+
+    modules = get_entry_modules()
+    try:
+        reports = [measure(modules) for _ in range(args.runs)]
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+
+    median = statistics.median(elapsed for elapsed, _ in reports)
+    heavy = sorted({name for _, names in reports for name in names})
+    failed = True
+    if heavy:
+        status = f"imports {', '.join(heavy)}"
+    elif median > args.budget:
+        status = f"over budget of {args.budget * 1000:.0f} ms"
+    else:
+        status = "ok"
+        failed = False
+    print(f"waypaper startup imports {median * 1000:7.1f} ms  {status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import random
+
+from waypaper.shuffle import ShuffleBag, get_fingerprint
+
+
+def test_fingerprint_fits_sqlite_integer():
+    image_paths = [f"/images/{n:05}.jpg" for n in range(10_000)]
+    assert 0 <= get_fingerprint(image_paths) < 1 << 63
+
+
+def test_draw_from_large_bag(tmp_path):
+    image_paths = [f"/images/{n:05}.jpg" for n in range(10_000)]
+    bag = ShuffleBag(tmp_path)
+    drawn = {bag.draw(image_paths) for _ in range(100)}
+    assert len(drawn) == 100
+    assert drawn <= set(image_paths)
+    assert not bag.db.in_transaction
+
+
+def test_draw_does_not_repeat_until_bag_is_empty(tmp_path):
+    image_paths = [f"/images/{n}.jpg" for n in range(20)]
+    bag = ShuffleBag(tmp_path)
+    assert sorted(bag.draw(image_paths) for _ in range(20)) == sorted(image_paths)
+
+
+def test_reconcile_after_last_drawn_image_was_removed(tmp_path):
+    bag = ShuffleBag(tmp_path)
+    image_paths = ["a", "b", "c"]
+    drawn = [bag.draw(image_paths) for _ in range(3)]
+    remaining = [path for path in image_paths if path != drawn[-1]]
+    assert bag.draw([*remaining, "d"]) == "d"
+
+
+def test_reconcile_when_cursor_is_past_the_bag(tmp_path, monkeypatch):
+    # Keep the order of the paths, so "a" and "b" are drawn first:
+    monkeypatch.setattr(random, "sample", lambda paths, count: list(paths))
+    bag = ShuffleBag(tmp_path)
+    bag.draw(["a", "b", "c"])
+    bag.draw(["a", "b", "c"])
+    assert bag.draw(["a", "d"]) in {"a", "d"}
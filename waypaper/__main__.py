@@ -1,12 +1,13 @@
 """Main module that either runs cli commands or starts GUI"""
 
-import argparse, sys, time, json, pathlib, threading
+import argparse, sys, json, pathlib, threading
 
-from waypaper.app import App
-from waypaper.changer import change_wallpaper
-from waypaper.common import get_random_file
+from waypaper.changer import change_wallpaper, change_wallpapers
+from waypaper.client import send_command
+from waypaper.common import get_random_file, get_next_random_files
 from waypaper.config import Config
-from waypaper.options import BackendOptions, FillOptions, MONITOR_OPTIONS
+from waypaper.inventory import Inventory
+from waypaper.options import BackendOptions, FillOptions, get_monitor_options
 from i18n import I18N, Languages
 
 
@@ -27,14 +28,65 @@ parser.add_argument("--folder", help=txt.arg_folder, nargs="+", default=[])
 parser.add_argument("--state-file", help=txt.arg_statefile)
 parser.add_argument("--backend", help=txt.arg_back, choices=BackendOptions)
 parser.add_argument("--list", help=txt.arg_list, action="store_true")
-parser.add_argument("--monitor", help=txt.arg_monitor, choices=MONITOR_OPTIONS)
+parser.add_argument("--monitor", help=txt.arg_monitor)
 parser.add_argument("--no-post-command", help=txt.arg_post, action="store_true")
 args = parser.parse_args()
 
 
+def run_with_daemon() -> bool:
+    """Pass the request to waypaperd if it is running, and return whether it was handled"""
+
+    # The daemon uses its own settings, so requests that override them are run here:
+    if args.folder or args.backend or args.fill or args.state_file or args.no_post_command:
+        return False
+
+    if args.restore:
+        reply = send_command("restore")
+    elif args.random or (args.monitor and not args.wallpaper):
+        reply = send_command("random", monitor=args.monitor)
+    elif args.wallpaper:
+        wallpaper = pathlib.Path(args.wallpaper).expanduser().absolute()
+        reply = send_command("set", wallpaper=str(wallpaper), monitor=args.monitor or "All")
+    elif args.list:
+        reply = send_command("list")
+    else:
+        return False
+
+    if reply is None:
+        return False
+    if reply["status"] != "ok":
+        print(reply["message"])
+        sys.exit(1)
+    if args.list:
+        print(json.dumps(reply["wallpapers"]))
+        return True
+
+    # Report each monitor like the changes made here, and fail if any of them failed:
+    results = reply.get("results", [])
+    for result in results:
+        status = "ok" if result["success"] else "failed"
+        print(f"{result['monitor']}: {status} in {result['seconds'] * 1000:.0f} ms")
+    if not all(result["success"] for result in results):
+        sys.exit(1)
+    return True
+
+
 def run():
     """Read user arguments and either run GUI app or perform requested action"""
 
+    # Monitors are probed only if one was requested, since it is slow:
+    if args.monitor:
+        monitor_options = get_monitor_options()
+        if args.monitor not in monitor_options:
+            parser.error(
+                f"argument --monitor: invalid choice: '{args.monitor}' "
+                f"(choose from {', '.join(monitor_options)})"
+            )
+
+    # If waypaperd is running, it changes the wallpaper without the startup costs:
+    if run_with_daemon():
+        sys.exit(0)
+
     # Read user arguments, and update things if alternative state file was provided:
     # TODO: Change this. parser.parse_args should use a callback
     cf.read_parameters_from_user_arguments(args)
@@ -43,6 +95,11 @@ def run():
         cf.read_parameters_from_user_arguments(args)
     cf.check_validity()
 
+    # Random wallpapers of all monitors are picked from one inventory, loaded once:
+    inventory = None
+    if args.random or (args.monitor and not args.wallpaper):
+        inventory = Inventory(cf.cache_dir)
+
     # Set monitor and wallpaper from user arguments:
     if args.monitor:
         monitor = args.monitor
@@ -60,6 +117,7 @@ def run():
                 cf.include_all_subfolders,
                 cf.cache_dir,
                 cf.show_hidden,
+                inventory,
             )
             if wallpaper_str:
                 wallpaper = pathlib.Path(wallpaper_str)
@@ -67,9 +125,8 @@ def run():
                 print("Could not get random wallpaper.")
                 sys.exit(0)
 
-        # Launch commands to change wallpaper in a separate thread:
-        threading.Thread(target=change_wallpaper, args=(wallpaper, cf, monitor)).start()
-        time.sleep(0.1)
+        # Change wallpaper, which returns once the backend has applied it:
+        change_wallpaper(wallpaper, cf, monitor)
 
         # Save this wallpaper in config and quit:
         cf.selected_wallpaper = wallpaper
@@ -83,6 +140,8 @@ def run():
 
     # Set previous wallpapers or random wallpaper:
     if args.restore or args.random:
+        changes = []
+        indexes = []
         for index, (wallpaper, monitor) in enumerate(zip(cf.wallpapers, cf.monitors)):
             if args.random:
                 wallpaper_str = get_random_file(
@@ -92,26 +151,35 @@ def run():
                     cf.include_all_subfolders,
                     cf.cache_dir,
                     cf.show_hidden,
+                    inventory,
                 )
                 if wallpaper_str:
                     wallpaper = pathlib.Path(wallpaper_str)
-                    cf.wallpapers[index] = wallpaper
-
-            if cf.wallpapers[index] is None:
-                continue
-
-            # Launch commands to change wallpaper in a separate thread:
-            threading.Thread(
-                target=change_wallpaper, args=(wallpaper, cf, monitor)
-            ).start()
-            time.sleep(0.1)
+            if wallpaper is not None:
+                changes.append((wallpaper, monitor))
+                indexes.append(index)
+
+        # With hyprpaper, decode the images of the next random change in advance:
+        preload = []
+        if args.random and cf.backend == "hyprpaper" and cf.hyprpaper_preload_ahead:
+            next_files = get_next_random_files(cf.cache_dir, len(changes))
+            preload = [pathlib.Path(path) for path in next_files]
+
+        # Change all monitors at once and remember only wallpapers that were set:
+        results = change_wallpapers(changes, cf, preload)
+        for index, result in zip(indexes, results):
+            status = "ok" if result.success else "failed"
+            print(f"{result.monitor}: {status} in {result.seconds * 1000:.0f} ms")
+            if result.success:
+                cf.wallpapers[index] = result.wallpaper
 
         # Save new wallpapers:
-        if cf.use_xdg_state:
-            cf.save_state_file()
-        else:
-            cf.save()
-        sys.exit(0)
+        if any(result.success for result in results):
+            if cf.use_xdg_state:
+                cf.save_state_file()
+            else:
+                cf.save()
+        sys.exit(0 if all(result.success for result in results) else 1)
 
     # Set wallpaper from user arguments:
     if args.wallpaper:
@@ -149,7 +217,9 @@ def run():
         print(f"waypaper v.{__version__}")
         sys.exit(0)
 
-    # Start GUI:
+    # Start GUI, importing Gtk only now:
+    from waypaper.app import App
+
     app = App(txt, cf)
     app.run()
 
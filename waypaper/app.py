@@ -1,24 +1,39 @@
 """Module that runs GUI app"""
 
 import threading
-import subprocess
 import os
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 import gi
-import shutil
-import imageio
-import screeninfo
 from pathlib import Path
+from typing import Any, Callable, Iterator
 
-from waypaper.consts import VIDEO_EXTENSIONS
+from waypaper.consts import (
+    VIDEO_EXTENSIONS,
+    THUMBNAIL_BATCH_SIZE,
+    SEARCH_DELAY,
+    PREVIEW_FRAME_DELAY,
+)
 from waypaper.changer import change_wallpaper
 from waypaper.config import Config
+from waypaper.cache import ThumbnailIndex
+from waypaper.inventory import Inventory
+from waypaper.ipc import find_process_ids, kill_processes, mpv_command
+from waypaper.search import SearchIndex
+from waypaper.scanner import stat_files
+from waypaper.table import ImageTable
+from waypaper.preview import make_preview, load_preview
+from waypaper.watcher import create_watcher
 from waypaper.common import (
     get_image_paths,
     get_image_name,
     get_random_file,
-    cache_image,
+    is_image_included,
+    ThumbnailPool,
+    cache_placeholder,
 )
 from waypaper.options import (
+    get_monitor_options,
     FillOptions,
     SortOptions,
     SortDirection,
@@ -44,6 +59,25 @@ class App(Gtk.Window):
         self.highlighted_image_row = 0
         self.is_enering_text = False
         self.number_of_resize = 0
+        self.scan_id = 0
+        self.images = ImageTable()
+        self.search_index = SearchIndex()
+        self.search_query = ""
+        self.search_results = None
+        self.search_mask = bytearray()
+        self.search_ranks = {}
+        self.search_timeout = None
+        self.finished_scan_id = 0
+        self.watcher = None
+        self.preview_executor = ThreadPoolExecutor(max_workers=1)
+        self.preview_path = None
+        self.preview_index = 0
+        self.preview_thumbnail = None
+        self.preview_frames = []
+        self.preview_frame = 0
+        self.preview_timeout = None
+        self.thumbnail_index = ThumbnailIndex(self.cf.cache_dir)
+        self.inventory = Inventory(self.cf.cache_dir)
         self.init_ui()
         self.backend_option_combo.grab_focus()
 
@@ -57,22 +91,6 @@ class App(Gtk.Window):
         self.main_box = Gtk.VBox(spacing=10)
         self.add(self.main_box)
 
-        # Load and apply CSS
-        css_provider = Gtk.CssProvider()
-        css = b"""
-        .highlighted-button {
-            border: 1px solid @theme_selected_bg_color;
-        }
-        """
-        css_provider.load_from_data(css)
-
-        # Apply CSS to the default screen
-        screen = Gdk.Screen.get_default()
-        context = Gtk.StyleContext()
-        context.add_provider_for_screen(
-            screen, css_provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
-        )
-
         # TOP MENU
 
         # Create a box to contain the top row of items:
@@ -165,18 +183,24 @@ class App(Gtk.Window):
             Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.AUTOMATIC
         )
 
-        # Create a box to center the grid:
-        self.center_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
-        self.center_box.set_valign(Gtk.Align.CENTER)
-        self.center_box.set_halign(Gtk.Align.CENTER)
         self.main_box.add(self.scrolled_window)
 
-        # Create a grid layout for images:
-        self.grid = Gtk.Grid()
-        self.grid.set_row_spacing(0)
-        self.grid.set_column_spacing(0)
-        self.center_box.add(self.grid)
-        self.scrolled_window.add(self.center_box)
+        # Create a store of thumbnails and tooltips of all images, in the order of the table:
+        self.all_images_store = Gtk.ListStore(GdkPixbuf.Pixbuf, str)
+        self.image_store = self.all_images_store
+
+        # Create an icon view for images, which only draws the thumbnails that are visible:
+        self.grid = Gtk.IconView.new_with_model(self.image_store)
+        self.grid.set_pixbuf_column(0)
+        self.grid.set_tooltip_column(1)
+        self.grid.set_columns(self.cf.number_of_columns)
+        self.grid.set_item_width(240)
+        self.grid.set_selection_mode(Gtk.SelectionMode.SINGLE)
+        self.grid.set_activate_on_single_click(True)
+        self.grid.connect("item-activated", self.on_image_activated)
+        self.grid.add_events(Gdk.EventMask.POINTER_MOTION_MASK)
+        self.grid.connect("motion-notify-event", self.on_grid_motion)
+        self.scrolled_window.add(self.grid)
 
         # BACKEND MENU
 
@@ -365,7 +389,7 @@ class App(Gtk.Window):
         monitor_names = ["All"]
         if self.cf.backend in ["feh", "wallutils", "none"]:
             return
-        monitor_names.extend([m.name for m in screeninfo.get_monitors()])
+        monitor_names.extend(get_monitor_options())
 
         # Create a monitor option dropdown menu:
         self.monitor_option_combo = Gtk.ComboBoxText()
@@ -468,125 +492,480 @@ class App(Gtk.Window):
 
     def process_images(self) -> None:
         """Load images from the selected folder, resize them, and arrange into a grid"""
+        self.scan_id += 1
+        scan_id = self.scan_id
 
-        self.image_paths = get_image_paths(
+        image_paths = get_image_paths(
             self.cf.backend,
             self.cf.image_folder_list,
             self.cf.include_subfolders,
             self.cf.include_all_subfolders,
             self.cf.show_hidden,
             self.cf.show_gifs_only,
+            self.inventory,
         )
 
+        # Stat the listed images to sort them and to validate their thumbnails, since
+        # rewriting a file does not change the mtime that the inventory is checked by:
+        files = stat_files(image_paths)
+        image_paths = [path for path in image_paths if path in files]
+
         # Sort paths:
-        if self.cf.sort_option in ["name", "namerev"]:
-            self.image_paths.sort(reverse=(self.cf.sort_option == "namerev"))
-        if self.cf.sort_option in ["date", "daterev"]:
-            self.image_paths.sort(
-                key=lambda x: os.path.getmtime(x),
-                reverse=(self.cf.sort_option == "daterev"),
-            )
+        sort_key, reverse = self.get_sort_key(files)
+        if sort_key:
+            image_paths.sort(key=sort_key, reverse=reverse)
+
+        # Keep track of files that appear, disappear or change in the folders:
+        self.watch_folders()
 
         # Show caching label:
-        self.loading_label = Gtk.Label(label=self.txt.msg_caching)
-        self.bottom_loading_box.add(self.loading_label)
+        loading_label = Gtk.Label(label=self.txt.msg_caching)
+        self.bottom_loading_box.add(loading_label)
         self.show_all()
 
-        self.thumbnails = []
-        self.image_names = []
+        # Empty the grid and fill it with images batch by batch, as soon as they are cached:
+        GLib.idle_add(self.clear_image_grid, scan_id)
+        shown = 0
+        batches = self.iter_image_batches(image_paths, files)
+        try:
+            for batch in batches:
+                if scan_id != self.scan_id:
+                    batches.close()
+                    break
+                shown += len(batch)
+                GLib.idle_add(self.append_to_image_grid, batch, scan_id)
+                GLib.idle_add(
+                    loading_label.set_text,
+                    f"{self.txt.msg_caching} {shown}/{len(image_paths)}",
+                )
 
-        for image_path in self.image_paths:
+        # When image processing is done, remove caching label, even if it failed midway:
+        finally:
+            GLib.idle_add(self.bottom_loading_box.remove, loading_label)
+            GLib.idle_add(self.finish_scan, scan_id)
+
+        # Keep the thumbnail cache within its limits, but never drop the listed images:
+        if scan_id == self.scan_id:
+            self.thumbnail_index.collect_garbage()
+            self.thumbnail_index.evict(
+                self.cf.thumbnail_cache_size * 1024 * 1024,
+                self.cf.thumbnail_cache_entries,
+                self.thumbnail_index.get_digests(image_paths),
+            )
 
-            # Skip zero byte files inside the image_path:
-            if os.path.getsize(image_path) == 0:
-                self.image_paths.remove(image_path)
-                continue
+    def finish_scan(self, scan_id: int) -> None:
+        """Mark the scan as complete, so that changes in the folders can be applied to it"""
+        self.finished_scan_id = scan_id
 
-            # If this image is not cached yet, resize and cache it:
-            cached_image_path = self.cf.cache_dir / os.path.basename(image_path)
-            if not cached_image_path.exists():
-                cache_image(image_path, self.cf.cache_dir)
+    def get_sort_key(
+        self, files: dict[str, tuple[int, int]] | None = None
+    ) -> tuple[Callable[[str], Any] | None, bool]:
+        """Get the key function used to sort images and whether the order is reversed"""
+        if self.cf.sort_option in ["name", "namerev"]:
+            return str, self.cf.sort_option == "namerev"
+        if self.cf.sort_option in ["date", "daterev"]:
+            files = files or {}
+
+            def get_mtime(path: str) -> int:
+                return files[path][1] if path in files else os.stat(path).st_mtime_ns
+
+            return get_mtime, self.cf.sort_option == "daterev"
+        return None, False
+
+    def find_sorted_position(self, path: str, size: int, mtime: int) -> int:
+        """Find the position where the image should be inserted to keep the grid sorted"""
+        sort_key, reverse = self.get_sort_key({path: (size, mtime)})
+        if sort_key is None:
+            return len(self.images)
+        key = sort_key(path)
+        low, high = 0, len(self.images)
+        while low < high:
+            middle = (low + high) // 2
+            if self.cf.sort_option in ["date", "daterev"]:
+                middle_key = self.images.mtimes[middle]
+            else:
+                middle_key = sort_key(self.images.get_path(middle))
+            if (key > middle_key) if reverse else (key < middle_key):
+                high = middle
+            else:
+                low = middle + 1
+        return low
 
-            # Load cached thumbnail:
-            thumbnail = GdkPixbuf.Pixbuf.new_from_file(str(cached_image_path))
-            self.thumbnails.append(thumbnail)
+    def watch_folders(self) -> None:
+        """Start watching the image folders, unless the same folders are watched already"""
+        if self.watcher and self.watcher.folders == list(self.cf.image_folder_list):
+            return
+        if self.watcher:
+            self.watcher.stop()
+        self.watcher = create_watcher(
+            self.cf.image_folder_list,
+            self.on_folder_changes,
+            self.inventory.get_files(self.cf.image_folder_list),
+            self.inventory,
+        )
+        self.watcher.start()
 
-            # Get image name, which may or may not include parent folders:
-            image_name = get_image_name(
-                image_path, self.cf.image_folder_list, self.cf.show_path_in_tooltip
+    def on_folder_changes(
+        self, added: list[str], removed: list[str], modified: list[str]
+    ) -> None:
+        """Cache images that appeared or changed in the folders, runs in the watcher thread"""
+        scan_id = self.scan_id
+        image_paths = [
+            path
+            for path in added + modified
+            if is_image_included(
+                self.cf.backend,
+                path,
+                self.cf.image_folder_list,
+                self.cf.include_subfolders,
+                self.cf.include_all_subfolders,
+                self.cf.show_hidden,
+                self.cf.show_gifs_only,
             )
-            self.image_names.append(image_name)
+        ]
+        if not image_paths and not removed:
+            return
+        rows = [row for batch in self.iter_image_batches(image_paths) for row in batch]
+        GLib.idle_add(self.apply_folder_changes, rows, removed, scan_id)
+
+    def apply_folder_changes(
+        self,
+        rows: list[tuple[str, int, int, GdkPixbuf.Pixbuf]],
+        removed: list[str],
+        scan_id: int,
+    ) -> None:
+        """Update the grid with images that appeared, disappeared or changed in the folders"""
+        if scan_id != self.scan_id or scan_id != self.finished_scan_id:
+            return
+        self.stop_preview()
+
+        # Remove images that are gone, as well as old versions of the changed ones:
+        outdated_paths = set(removed) | {path for path, _, _, _ in rows}
+        for index in reversed(self.images.find(outdated_paths)):
+            self.images.delete(index)
+            tree_path = Gtk.TreePath.new_from_indices([index])
+            self.all_images_store.remove(self.all_images_store.get_iter(tree_path))
+
+        # Insert new images where they belong in the sorted order:
+        for path, size, mtime, thumbnail in rows:
+            index = self.find_sorted_position(path, size, mtime)
+            self.images.insert(index, path, size, mtime, thumbnail)
+            self.all_images_store.insert(index, self.get_image_row(index))
+
+        # Positions have shifted, so the search has to start over:
+        self.search_index = SearchIndex(map(self.get_image_name, range(len(self.images))))
+        if self.search_results is not None:
+            self.search_results = None
+            self.search_query = ""
+            self.apply_search()
+
+    def prepare_batch(
+        self,
+        image_paths: list[str],
+        files: dict[str, tuple[int, int]],
+        pending: dict[Path, tuple[Future, list[tuple[str, int, int, str]]]],
+        pool: ThumbnailPool,
+    ) -> list[tuple[str, int, int, Path]]:
+        """Find the thumbnails of the images by contents and start making the missing ones"""
+        entries = []
+        for image_path in image_paths:
+            # Reuse the size and modification time that the caller has taken when known:
+            if image_path in files:
+                size, mtime = files[image_path]
+            else:
+                try:
+                    stat = os.stat(image_path)
+                except OSError:
+                    continue
+                size, mtime = stat.st_size, stat.st_mtime_ns
+
+            # Skip zero byte files inside the image_path:
+            if size == 0:
+                continue
 
-        # When image processing is done, remove caching label and display the images:
-        self.bottom_loading_box.remove(self.loading_label)
-        GLib.idle_add(self.load_image_grid)
+            # If this image is not cached yet or has changed, find its thumbnail by contents:
+            cached_image_path = self.thumbnail_index.lookup(image_path, size, mtime)
+            if cached_image_path is None:
+                try:
+                    digest = self.thumbnail_index.get_digest(image_path, size, mtime)
+                except OSError:
+                    continue
+                cached_image_path = self.thumbnail_index.thumbnail_path(digest)
+
+                # Copies of an image share the thumbnail, so it is made at most once:
+                if self.thumbnail_index.has_thumbnail(digest):
+                    self.thumbnail_index.add(image_path, size, mtime, digest)
+                else:
+                    if cached_image_path not in pending:
+                        future = pool.submit(image_path, cached_image_path)
+                        pending[cached_image_path] = (future, [])
+                    pending[cached_image_path][1].append((image_path, size, mtime, digest))
+            entries.append((image_path, size, mtime, cached_image_path))
+        return entries
+
+    def iter_image_batches(
+        self, image_paths: list[str], files: dict[str, tuple[int, int]] | None = None
+    ) -> Iterator[list[tuple[str, int, int, GdkPixbuf.Pixbuf]]]:
+        """Cache images and yield them in their sorted order as batches of rows for the grid"""
+        files = files or {}
+        pending = {}
+        chunks = [
+            image_paths[start : start + THUMBNAIL_BATCH_SIZE]
+            for start in range(0, len(image_paths), THUMBNAIL_BATCH_SIZE)
+        ]
 
-    def get_filtered_images(self) -> list:
-        """Filter image paths, names, and thumbnails based on the search query, if any"""
-        # Read what is written in the search bar, and if nothing, return all images:
+        # Images are hashed one batch ahead, while workers resize the batch before it:
+        pool = ThumbnailPool(self.cf.thumbnail_workers)
+        try:
+            entries = self.prepare_batch(chunks[0], files, pending, pool) if chunks else []
+            for number in range(len(chunks)):
+                batch_entries = entries
+                if number + 1 < len(chunks):
+                    entries = self.prepare_batch(chunks[number + 1], files, pending, pool)
+                if not batch_entries:
+                    continue
+
+                # Release the batch once all its thumbnails are saved:
+                for *_, cached_image_path in batch_entries:
+                    if cached_image_path not in pending:
+                        continue
+                    future, waiting = pending.pop(cached_image_path)
+                    wait([future])
+
+                    # If a worker died, show a placeholder now but make the thumbnail again
+                    # on the next scan, since the crash may have been caused by another file:
+                    error = future.exception()
+                    if error is not None:
+                        print(f"Could not generate preview for {waiting[0][0]}: {error}")
+                        cache_placeholder(cached_image_path)
+                        continue
+                    for image_path, size, mtime, digest in waiting:
+                        self.thumbnail_index.add(image_path, size, mtime, digest)
+
+                batch = []
+                for image_path, size, mtime, cached_image_path in batch_entries:
+                    thumbnail = GdkPixbuf.Pixbuf.new_from_file(str(cached_image_path))
+                    batch.append((image_path, size, mtime, thumbnail))
+                self.thumbnail_index.mark_shown([cached for *_, cached in batch_entries])
+                yield batch
+        finally:
+            pool.shutdown()
+            self.thumbnail_index.commit()
+
+    def apply_search(self) -> bool:
+        """Filter images by the search query, narrowing the previous results when possible"""
+        self.search_timeout = None
         search_query = self.search_entry.get_text().lower()
         if not search_query:
-            return self.thumbnails, self.image_names, self.image_paths
+            self.search_results = None
+        else:
+            # If the query only grew, matches can only be among the previous results:
+            within = None
+            if self.search_results is not None and self.search_query in search_query:
+                within = self.search_results
+            self.search_results = self.search_index.search(
+                search_query, within, self.cf.fuzzy_search
+            )
+        self.search_query = search_query
+        self.load_image_grid()
+        return False
 
-        # Otherwise, filter only images whos names match the search query:
-        image_names = [
-            name for name in self.image_names if search_query in name.lower()
-        ]
-        thumbnails = [
-            self.thumbnails[i]
-            for i in range(len(self.image_names))
-            if search_query in self.image_names[i].lower()
-        ]
-        image_paths = [
-            self.image_paths[i]
-            for i in range(len(self.image_names))
-            if search_query in self.image_names[i].lower()
-        ]
+    def get_image_name(self, index: int) -> str:
+        """Get the name of the image at the position, which may or may not include parent folders"""
+        if not self.cf.show_path_in_tooltip:
+            return self.images.names[index]
+        return get_image_name(self.images.get_path(index), self.cf.image_folder_list, True)
+
+    def get_image_row(self, index: int) -> list:
+        """Get the row of the grid store for the image at the given position"""
+        name = GLib.markup_escape_text(self.get_image_name(index))
+        return [self.images.thumbnails[index], name]
+
+    def get_store_index(self, model: Gtk.TreeModel, tree_path: Gtk.TreePath) -> int:
+        """Follow a row of a filtered or sorted model down to its position in the full store"""
+        while model is not self.all_images_store:
+            tree_path = model.convert_path_to_child_path(tree_path)
+            model = model.get_model()
+        return tree_path.get_indices()[0]
+
+    def get_table_index(self, store_index: int) -> int:
+        """Get the position in the image table of a row of the shown grid"""
+        tree_path = Gtk.TreePath.new_from_indices([store_index])
+        return self.get_store_index(self.image_store, tree_path)
+
+    def get_shown_path(self, store_index: int) -> str:
+        """Get the path of the image at the position in the shown grid"""
+        return self.images.get_path(self.get_table_index(store_index))
+
+    def is_row_visible(self, model: Gtk.TreeModel, tree_iter: Gtk.TreeIter, data) -> bool:
+        """Check if the row of the full store matches the search, used by the filter"""
+        index = model.get_path(tree_iter).get_indices()[0]
+        return index < len(self.search_mask) and self.search_mask[index] == 1
+
+    def compare_ranks(
+        self, model: Gtk.TreeModel, iter_a: Gtk.TreeIter, iter_b: Gtk.TreeIter, data
+    ) -> int:
+        """Order rows of the filter by the rank of their fuzzy match"""
+        index_a = self.get_store_index(model, model.get_path(iter_a))
+        index_b = self.get_store_index(model, model.get_path(iter_b))
+        return self.search_ranks.get(index_a, 0) - self.search_ranks.get(index_b, 0)
+
+    def clear_image_grid(self, scan_id: int) -> None:
+        """Forget the images of the previous scan and empty the grid"""
+        if scan_id != self.scan_id:
+            return
+        self.images = ImageTable()
+        self.search_index = SearchIndex()
+        if self.search_results is not None:
+            self.search_results = array("I")
+        self.stop_preview()
+        self.grid.set_model(None)
+        self.all_images_store.clear()
+        self.load_image_grid()
 
-        return thumbnails, image_names, image_paths
+    def append_to_image_grid(
+        self, batch: list[tuple[str, int, int, GdkPixbuf.Pixbuf]], scan_id: int
+    ) -> None:
+        """Add a batch of freshly processed images to the end of the grid"""
+        if scan_id != self.scan_id:
+            return
+        for path, size, mtime, thumbnail in batch:
+            index = self.images.append(path, size, mtime, thumbnail)
+            self.search_index.add(self.get_image_name(index))
+
+            # If the grid is filtered, mark whether the image matches before the filter sees it:
+            if self.search_results is not None:
+                matches = self.search_index.matches(
+                    self.search_query, index, self.cf.fuzzy_search
+                )
+                self.search_mask.append(matches)
+                if matches:
+                    self.search_ranks[index] = len(self.search_results)
+                    self.search_results.append(index)
+            self.all_images_store.append(self.get_image_row(index))
+        self.highlight_selected_image()
 
     def load_image_grid(self) -> None:
-        """Reload the grid of images"""
-
-        thumbnails, image_names, image_paths = self.get_filtered_images()
-
-        # Clear existing images:
-        for child in self.grid.get_children():
-            self.grid.remove(child)
-
-        current_y = 0
-        current_row_heights = [0] * self.cf.number_of_columns
-        for index, [thumbnail, name, path] in enumerate(
-            zip(thumbnails, image_names, image_paths)
-        ):
-
-            row = index // self.cf.number_of_columns
-            column = index % self.cf.number_of_columns
-
-            # Calculate current y coordinate in the scroll window:
-            aspect_ratio = thumbnail.get_width() / thumbnail.get_height()
-            current_row_heights[column] = int(240 / aspect_ratio)
-            if column == 0:
-                current_y += max(current_row_heights) + 10
-                current_row_heights = [0] * self.cf.number_of_columns
-
-            # Create a button with an image and add tooltip:
-            image = Gtk.Image.new_from_pixbuf(thumbnail)
-            image.set_tooltip_text(name)
-            button = Gtk.Button()
-            if index == self.selected_index:
-                button.set_relief(Gtk.ReliefStyle.NORMAL)
-                button.get_style_context().add_class("highlighted-button")
-                self.highlighted_image_y = current_y
-            else:
-                button.set_relief(Gtk.ReliefStyle.NONE)
-            button.add(image)
+        """Show either all images or only those that match the search in the grid"""
+        self.stop_preview()
+        if self.search_results is None:
+            self.image_store = self.all_images_store
+        else:
+            # The filter shows rows of the full store by the results, without copying them:
+            self.search_mask = bytearray(len(self.images))
+            for index in self.search_results:
+                self.search_mask[index] = 1
+            self.image_store = self.all_images_store.filter_new()
+            self.image_store.set_visible_func(self.is_row_visible)
+
+            # Fuzzy results are ranked, so the matching rows are sorted by their rank:
+            if self.cf.fuzzy_search:
+                self.search_ranks = {
+                    index: rank for rank, index in enumerate(self.search_results)
+                }
+                self.image_store = Gtk.TreeModelSort(model=self.image_store)
+                self.image_store.set_default_sort_func(self.compare_ranks)
+                self.image_store.set_sort_column_id(
+                    Gtk.TREE_SORTABLE_DEFAULT_SORT_COLUMN_ID, Gtk.SortType.ASCENDING
+                )
+        self.grid.set_model(self.image_store)
+        self.highlight_selected_image()
 
-            # Add button to the grid and connect clicked event:
-            self.grid.attach(button, column, row, 1, 1)
-            button.connect("clicked", self.on_image_clicked, path)
+    def select_image(self, index: int) -> None:
+        """Move the highlight to another image, so only the two affected cells are redrawn"""
+        if not len(self.image_store):
+            return
+        index = min(max(index, 0), len(self.image_store) - 1)
+        self.grid.unselect_path(Gtk.TreePath.new_from_indices([self.selected_index]))
+        self.selected_index = index
+        self.highlight_selected_image()
+        self.scroll_to_selected_image()
+        self.start_preview(index)
+
+    def start_preview(self, index: int) -> None:
+        """Play the animated preview of the GIF or video at the position in the grid"""
+        if index >= len(self.image_store):
+            return
+        table_index = self.get_table_index(index)
+        image_path = self.images.get_path(table_index)
+        if image_path == self.preview_path:
+            return
+        self.stop_preview()
+        if not self.images.is_animated(table_index):
+            return
+        self.preview_path = image_path
+        self.preview_index = table_index
+        self.preview_executor.submit(self.prepare_preview, image_path)
+
+    def prepare_preview(self, image_path: str) -> None:
+        """Make the strip of preview frames unless it is cached, runs in the preview thread"""
+        # Skip requests for tiles that the pointer has already left:
+        if image_path != self.preview_path:
+            return
+        try:
+            stat = os.stat(image_path)
+            digest = self.thumbnail_index.get_digest(image_path, stat.st_size, stat.st_mtime_ns)
+            preview_file = self.thumbnail_index.preview_path(digest)
+            if not preview_file.exists():
+                make_preview(image_path, preview_file)
+        except Exception as e:
+            print(f"Could not generate animated preview for {os.path.basename(image_path)}")
+            print(e)
+            return
+        GLib.idle_add(self.play_preview, image_path, preview_file)
 
-        self.show_all()
+    def play_preview(self, image_path: str, preview_file: Path) -> None:
+        """Start cycling the frames of the preview in its tile"""
+        if image_path != self.preview_path or not self.is_preview_shown():
+            return
+        try:
+            self.preview_frames = load_preview(preview_file)
+        except GLib.Error as e:
+            print(f"Could not load animated preview for {os.path.basename(image_path)}: {e}")
+            return
+        self.preview_thumbnail = self.all_images_store[self.preview_index][0]
+        self.preview_frame = 0
+        self.preview_timeout = GLib.timeout_add(PREVIEW_FRAME_DELAY, self.show_next_frame)
+
+    def is_preview_shown(self) -> bool:
+        """Check if the previewed image is still at its position in the table"""
+        return (
+            self.preview_index < len(self.images)
+            and self.images.get_path(self.preview_index) == self.preview_path
+        )
+
+    def show_next_frame(self) -> bool:
+        """Replace the pixbuf of the tile with the next frame of the preview"""
+        if not self.is_preview_shown():
+            self.preview_timeout = None
+            self.stop_preview()
+            return False
+        self.preview_frame = (self.preview_frame + 1) % len(self.preview_frames)
+        self.all_images_store[self.preview_index][0] = self.preview_frames[self.preview_frame]
+        return True
+
+    def stop_preview(self) -> None:
+        """Stop the animated preview and put the static thumbnail back in its tile"""
+        if self.preview_timeout is not None:
+            GLib.source_remove(self.preview_timeout)
+            self.preview_timeout = None
+        if self.preview_thumbnail is not None and self.is_preview_shown():
+            self.all_images_store[self.preview_index][0] = self.preview_thumbnail
+        self.preview_path = None
+        self.preview_thumbnail = None
+        self.preview_frames = []
+
+    def on_grid_motion(self, grid, event) -> bool:
+        """Play the preview of the animated wallpaper under the pointer"""
+        tree_path = grid.get_path_at_pos(int(event.x), int(event.y))
+        if tree_path is not None:
+            self.start_preview(tree_path.get_indices()[0])
+        return False
+
+    def highlight_selected_image(self) -> None:
+        """Mark the selected image in the grid, if it is already there"""
+        if self.selected_index < len(self.image_store):
+            self.grid.select_path(Gtk.TreePath.new_from_indices([self.selected_index]))
 
     # def on_window_resize(self, widget, allocation) -> None:
     # """Recalculate the number of columns on window resize and repopulate the grid"""
@@ -603,11 +982,9 @@ class App(Gtk.Window):
 
     def scroll_to_selected_image(self) -> None:
         """Scroll the window to see the highlighted image"""
-        scrolled_window_height = self.scrolled_window.get_vadjustment().get_page_size()
-        # current_y = self.highlighted_image_row * 180
-        subscreen_num = self.highlighted_image_y // scrolled_window_height
-        scroll = scrolled_window_height * subscreen_num
-        self.scrolled_window.get_vadjustment().set_value(scroll)
+        if self.selected_index < len(self.image_store):
+            tree_path = Gtk.TreePath.new_from_indices([self.selected_index])
+            self.grid.scroll_to_path(tree_path, False, 0.0, 0.0)
 
     def set_selected_wallpaper(self, path: str) -> None:
         """Set selected image as a wallpaper and save the state"""
@@ -653,10 +1030,7 @@ class App(Gtk.Window):
     def on_mpv_sound_toggled(self, toggle) -> None:
         """Toggle sound of mpv player"""
         self.cf.mpvpaper_sound = toggle.get_active()
-        subprocess.Popen(
-            f"echo 'cycle mute' | socat - /tmp/mpv-socket-{self.cf.selected_monitor}",
-            shell=True,
-        )
+        self.send_mpv_command("cycle", "mute")
 
     def on_include_subfolders_toggled(self, toggle) -> None:
         """Toggle subfolders visibility via menu"""
@@ -732,11 +1106,10 @@ class App(Gtk.Window):
         blue = int(rgba_color.blue * 255)
         self.cf.color = "#{:02X}{:02X}{:02X}".format(red, green, blue)
 
-    def on_image_clicked(self, widget, path: str) -> None:
+    def on_image_activated(self, icon_view, tree_path) -> None:
         """On clicking an image, set it as a wallpaper and save"""
-        self.selected_index = self.image_paths.index(path)
-        self.load_image_grid()
-        self.set_selected_wallpaper(path)
+        self.selected_index = tree_path.get_indices()[0]
+        self.set_selected_wallpaper(self.get_shown_path(self.selected_index))
 
     def on_refresh_clicked(self, widget) -> None:
         """On clicking refresh button, clear cache"""
@@ -744,14 +1117,21 @@ class App(Gtk.Window):
 
     def on_mpv_stop_button_clicked(self, widget) -> None:
         """On clicking mpv stop button, kill the mpvpaper"""
-        subprocess.Popen(["killall", "mpvpaper"])
+        kill_processes(find_process_ids("mpvpaper"))
 
     def on_mpv_pause_button_clicked(self, widget) -> None:
-        """On clicking mpv stop button, kill the mpvpaper"""
-        subprocess.Popen(
-            f"echo 'cycle pause' | socat - /tmp/mpv-socket-{self.cf.selected_monitor}",
-            shell=True,
-        )
+        """On clicking mpv pause button, pause or resume the mpvpaper"""
+        self.send_mpv_command("cycle", "pause")
+
+    def send_mpv_command(self, *command: str) -> None:
+        """Send a command to mpvpaper on the selected monitor, if it is running"""
+        try:
+            reply = mpv_command(self.cf.selected_monitor, *command)
+        except OSError as e:
+            print(f"Could not send {' '.join(command)} to mpvpaper: {e}")
+            return
+        if reply.get("error") != "success":
+            print(f"mpvpaper failed to {' '.join(command)}: {reply.get('error')}")
 
     def on_random_clicked(self, widget) -> None:
         """On clicking random button, set random wallpaper"""
@@ -769,6 +1149,8 @@ class App(Gtk.Window):
             self.cf.include_subfolders,
             self.cf.include_all_subfolders,
             self.cf.cache_dir,
+            self.cf.show_hidden,
+            self.inventory,
         )
         if new_wallpaper:
             self.cf.select_wallpaper(new_wallpaper)
@@ -783,10 +1165,9 @@ class App(Gtk.Window):
         self.cf.save()
 
     def clear_cache(self) -> None:
-        """Delete cache folder and reprocess the images"""
+        """Delete thumbnails of the listed images and reprocess the images"""
         try:
-            shutil.rmtree(self.cf.cache_dir)
-            os.makedirs(self.cf.cache_dir)
+            self.thumbnail_index.invalidate(list(self.images.iter_paths()))
         except OSError as e:
             print(f"{self.txt.err_cache} '{self.cf.cache_dir}': {e}")
         threading.Thread(target=self.process_images).start()
@@ -821,52 +1202,39 @@ class App(Gtk.Window):
             self.toggle_include_subfolders()
 
         elif event.keyval in [Gdk.KEY_h, Gdk.KEY_Left]:
-            self.selected_index = max(self.selected_index - 1, 0)
-            self.load_image_grid()
-            self.scroll_to_selected_image()
+            self.select_image(self.selected_index - 1)
 
         elif event.keyval in [Gdk.KEY_j, Gdk.KEY_Down]:
-            self.selected_index = min(
-                self.selected_index + self.cf.number_of_columns,
-                len(self.image_paths) - 1,
+            self.select_image(
+                min(
+                    self.selected_index + self.cf.number_of_columns,
+                    len(self.image_store) - 1,
+                )
             )
-            self.load_image_grid()
-            self.scroll_to_selected_image()
 
         elif event.keyval in [Gdk.KEY_k, Gdk.KEY_Up]:
-            self.selected_index = max(
-                self.selected_index - self.cf.number_of_columns, 0
-            )
-            self.load_image_grid()
-            self.scroll_to_selected_image()
+            self.select_image(self.selected_index - self.cf.number_of_columns)
 
         elif event.keyval in [Gdk.KEY_l, Gdk.KEY_Right]:
-            self.selected_index = min(
-                self.selected_index + 1, len(self.image_paths) - 1
-            )
-            self.load_image_grid()
-            self.scroll_to_selected_image()
+            self.select_image(self.selected_index + 1)
 
         elif event.keyval == Gdk.KEY_f:
             self.choose_folder()
 
         elif event.keyval == Gdk.KEY_g:
-            self.selected_index = 0
-            self.load_image_grid()
-            self.scroll_to_selected_image()
+            self.select_image(0)
 
         elif event.keyval == Gdk.KEY_G:
-            self.selected_index = len(self.image_paths) - 1
-            self.load_image_grid()
-            self.scroll_to_selected_image()
+            self.select_image(len(self.image_store) - 1)
 
         elif event.keyval == Gdk.KEY_question:
             message = self.txt.msg_help
             self.show_message(message)
 
         elif event.keyval == Gdk.KEY_Return or event.keyval == Gdk.KEY_KP_Enter:
-            wallpaper_path = self.image_paths[self.selected_index]
-            self.set_selected_wallpaper(wallpaper_path)
+            if self.selected_index < len(self.image_store):
+                wallpaper_path = self.get_shown_path(self.selected_index)
+                self.set_selected_wallpaper(wallpaper_path)
 
         # Prevent other default key handling:
         return event.keyval in [
@@ -881,7 +1249,10 @@ class App(Gtk.Window):
 
     def on_search_entry_changed(self, entry, event=None):
         """This function is triggered when the user types in the search field"""
-        self.load_image_grid()
+        # Filter the images only once the user pauses typing:
+        if self.search_timeout:
+            GLib.source_remove(self.search_timeout)
+        self.search_timeout = GLib.timeout_add(SEARCH_DELAY, self.apply_search)
 
     def on_clear_button(self, event):
         self.search_entry.set_text("")
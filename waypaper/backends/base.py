@@ -2,6 +2,8 @@ import os.path
 from pathlib import Path
 from abc import ABC, abstractmethod
 
+from waypaper.scanner import ScanEntry, get_max_depth, get_unique_entries, scan_folder
+
 
 class Backend(ABC):
     @property
@@ -20,6 +22,33 @@ class Backend(ABC):
         ext = os.path.splitext(path)[1].lower()
         return ext in self.allowed_extensions
 
+    def is_image_included(
+        self,
+        path: str,
+        folder: str,
+        include_subfolders: bool = False,
+        include_all_subfolders: bool = False,
+        include_hidden: bool = False,
+        only_gifs: bool = False,
+    ) -> bool:
+        """Check if a file inside the folder passes the same filters as get_supported_images."""
+        parts = Path(os.path.relpath(path, folder)).parts
+        if not parts or parts[0] == "..":
+            return False
+
+        depth = len(parts) - 1
+        if not include_subfolders and depth > 0:
+            return False
+        if not include_all_subfolders and depth > 1:
+            return False
+        if not include_hidden and any(part.startswith(".") for part in parts):
+            return False
+        if not self.is_extension_supported(path):
+            return False
+        if only_gifs and not path.lower().endswith(".gif"):
+            return False
+        return True
+
     def get_supported_images(
         self,
         folders: list[str],
@@ -29,34 +58,31 @@ class Backend(ABC):
         only_gifs: bool = False,
     ) -> list[str]:
         """Get a list of file paths depending on the filters that were requested."""
-        paths: list[str] = []
-
-        for folder in folders:
-            for root, directories, files in os.walk(folder, followlinks=True):
-                if not include_hidden:
-                    directories[:] = [d for d in directories if not d.startswith(".")]
-
-                if not include_subfolders and root != folder:
-                    continue
-
-                depth = len(Path(root).relative_to(folder).parts)
-                if not include_all_subfolders and depth > 1:
-                    continue
-
-                # Remove files that are not images from consideration:
-                for file in files:
-                    if not include_hidden and file.startswith("."):
-                        continue
-
-                    if not self.is_extension_supported(file):
-                        continue
-
-                    if only_gifs and not file.lower().endswith(".gif"):
-                        continue
-
-                    paths.append(os.path.join(root, file))
-
-        return paths
+        return [
+            entry.path
+            for entry in self.scan_images(
+                folders, include_subfolders, include_all_subfolders, include_hidden, only_gifs
+            )
+        ]
+
+    def scan_images(
+        self,
+        folders: list[str],
+        include_subfolders: bool = False,
+        include_all_subfolders: bool = False,
+        include_hidden: bool = False,
+        only_gifs: bool = False,
+    ) -> list[ScanEntry]:
+        """Get the images that pass the filters, each physical file once, with its stats."""
+        extensions = frozenset(self.allowed_extensions)
+        if only_gifs:
+            extensions &= {".gif"}
+        max_depth = get_max_depth(include_subfolders, include_all_subfolders)
+        return get_unique_entries(
+            entry
+            for folder in folders
+            for entry in scan_folder(folder, extensions, max_depth, include_hidden)
+        )
 
 
 class NoBackend(Backend):
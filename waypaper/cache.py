@@ -0,0 +1,246 @@
+"""Module that keeps track of cached thumbnails and the source images they were made from"""
+
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+from pathlib import Path
+
+from waypaper.options import IMAGE_EXTENSIONS
+
+# Bytes read from each end of a file to compute its content digest:
+DIGEST_CHUNK_SIZE = 64 * 1024
+
+
+def get_file_digest(path: str, size: int) -> str:
+    """
+    Get a digest of the file contents from its size, head and tail. Reading only the ends
+    keeps large images fast to hash, and only files that differ in the middle collide.
+    """
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, "rb") as file:
+        if size <= 2 * DIGEST_CHUNK_SIZE:
+            digest.update(file.read())
+        else:
+            digest.update(file.read(DIGEST_CHUNK_SIZE))
+            file.seek(-DIGEST_CHUNK_SIZE, os.SEEK_END)
+            digest.update(file.read(DIGEST_CHUNK_SIZE))
+    return digest.hexdigest()
+
+
+def remove_legacy_thumbnails(cache_dir: Path) -> None:
+    """Delete thumbnails that were saved under the names of their images in the cache"""
+    try:
+        entries = list(os.scandir(cache_dir))
+    except OSError:
+        return
+    for entry in entries:
+        if os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS:
+            continue
+        try:
+            if entry.is_file(follow_symlinks=False):
+                os.remove(entry.path)
+        except OSError as e:
+            print(f"Could not remove old thumbnail {entry.path}: {e}")
+
+
+class ThumbnailIndex:
+    """
+    Persistent map from absolute image paths to the digest of their contents, with the
+    modification time and size they had when hashed. Thumbnails are stored by digest,
+    so identical images in different folders share one thumbnail. The size of each
+    thumbnail and when it was last shown are kept to evict the least recently shown.
+    """
+
+    def __init__(self, cache_dir: Path) -> None:
+        self.thumbnail_dir = cache_dir / "thumbnails"
+        self.thumbnail_dir.mkdir(parents=True, exist_ok=True)
+        self.preview_dir = cache_dir / "previews"
+        self.preview_dir.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+
+        # Before the index existed, thumbnails were stored by file name right in the cache:
+        if not (cache_dir / "thumbnails.db").exists():
+            remove_legacy_thumbnails(cache_dir)
+        self.db = sqlite3.connect(cache_dir / "thumbnails.db", check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS digests "
+            "(path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, digest TEXT)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS thumbnail_usage "
+            "(digest TEXT PRIMARY KEY, size INTEGER, shown INTEGER)"
+        )
+
+        # Read the whole index once, so lookups do not touch the disk:
+        self.entries: dict[str, tuple[int, int, str]] = {
+            path: (mtime, size, digest)
+            for path, mtime, size, digest in self.db.execute(
+                "SELECT path, mtime, size, digest FROM digests"
+            )
+        }
+        self.usage: dict[str, tuple[int, int]] = {
+            digest: (size, shown)
+            for digest, size, shown in self.db.execute(
+                "SELECT digest, size, shown FROM thumbnail_usage"
+            )
+        }
+        self.pending: dict[str, tuple[int, int, str]] = {}
+        self.pending_usage: set[str] = set()
+
+    def thumbnail_path(self, digest: str) -> Path:
+        """Get the location where the thumbnail of the contents should be stored"""
+        return self.thumbnail_dir / f"{digest}.jpg"
+
+    def preview_path(self, digest: str) -> Path:
+        """Get the location of the animated preview, which lives as long as the thumbnail"""
+        return self.preview_dir / f"{digest}.jpg"
+
+    def get_digest(self, image_path: str, size: int, mtime: int) -> str:
+        """Get the content digest of the image, reusing the stored one if it did not change"""
+        entry = self.entries.get(os.path.abspath(image_path))
+        if entry is not None and entry[:2] == (mtime, size):
+            return entry[2]
+        return get_file_digest(image_path, size)
+
+    def has_thumbnail(self, digest: str) -> bool:
+        """Check if a complete thumbnail of the contents exists"""
+        return digest in self.usage and self.thumbnail_path(digest).exists()
+
+    def lookup(self, image_path: str, size: int, mtime: int) -> Path | None:
+        """Return the cached thumbnail if it is still valid for the given size and mtime"""
+        entry = self.entries.get(os.path.abspath(image_path))
+        if entry is None:
+            return None
+        if entry[:2] != (mtime, size) or entry[2] not in self.usage:
+            return None
+        digest = entry[2]
+        return self.thumbnail_path(digest)
+
+    def record_usage(self, digest: str, shown: int) -> None:
+        """Remember the size of the thumbnail and when it was shown, if it exists"""
+        try:
+            size = self.thumbnail_path(digest).stat().st_size
+        except OSError:
+            return
+        self.usage[digest] = (size, shown)
+        self.pending_usage.add(digest)
+
+    def add(self, image_path: str, size: int, mtime: int, digest: str) -> None:
+        """Record the digest of an image with a thumbnail, it is written on the next commit"""
+        entry = (mtime, size, digest)
+        absolute_path = os.path.abspath(image_path)
+        with self.lock:
+            self.entries[absolute_path] = entry
+            self.pending[absolute_path] = entry
+            if digest not in self.usage:
+                self.record_usage(digest, int(time.time()))
+
+    def mark_shown(self, thumbnails: list[Path]) -> None:
+        """Update the time when the thumbnails were last shown"""
+        now = int(time.time())
+        with self.lock:
+            for thumbnail in thumbnails:
+                if thumbnail.stem in self.usage:
+                    self.usage[thumbnail.stem] = (self.usage[thumbnail.stem][0], now)
+                    self.pending_usage.add(thumbnail.stem)
+
+    def commit(self) -> None:
+        """Write all pending entries to the index file"""
+        with self.lock:
+            if not self.pending and not self.pending_usage:
+                return
+            rows = [(path, *entry) for path, entry in self.pending.items()]
+            usage_rows = [
+                (digest, *self.usage[digest])
+                for digest in self.pending_usage
+                if digest in self.usage
+            ]
+            self.pending.clear()
+            self.pending_usage.clear()
+            self.db.executemany("INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?)", rows)
+            self.db.executemany(
+                "INSERT OR REPLACE INTO thumbnail_usage VALUES (?, ?, ?)", usage_rows
+            )
+            self.db.commit()
+
+    def remove_thumbnails(self, digests: set[str]) -> None:
+        """Delete thumbnail files and forget their usage, the lock must be held"""
+        for digest in digests:
+            self.usage.pop(digest, None)
+            self.pending_usage.discard(digest)
+            self.thumbnail_path(digest).unlink(missing_ok=True)
+            self.preview_path(digest).unlink(missing_ok=True)
+        self.db.executemany(
+            "DELETE FROM thumbnail_usage WHERE digest = ?", ((d,) for d in digests)
+        )
+
+    def remove_paths(self, paths: set[str]) -> None:
+        """Forget the digests of absolute image paths, the lock must be held"""
+        for path in paths:
+            self.entries.pop(path, None)
+            self.pending.pop(path, None)
+        self.db.executemany("DELETE FROM digests WHERE path = ?", ((p,) for p in paths))
+
+    def invalidate(self, image_paths: list[str]) -> None:
+        """Delete thumbnails of the images, so that they are made again on the next scan"""
+        with self.lock:
+            paths = {os.path.abspath(image_path) for image_path in image_paths}
+            digests = {self.entries[path][2] for path in paths if path in self.entries}
+            self.remove_thumbnails(digests)
+            self.remove_paths(paths)
+            self.db.commit()
+
+    def collect_garbage(self) -> None:
+        """Forget images that no longer exist and delete thumbnails that nothing refers to"""
+        with self.lock:
+            self.remove_paths({path for path in self.entries if not os.path.exists(path)})
+            referenced = {digest for _, _, digest in self.entries.values()}
+            self.remove_thumbnails(set(self.usage) - referenced)
+
+            # Files that are not in the index were left by older versions or interrupted jobs,
+            # but recent ones may be still being made:
+            recent = time.time() - 60
+            for folder in (self.thumbnail_dir, self.preview_dir):
+                for entry in os.scandir(folder):
+                    digest = entry.name.removesuffix(".jpg")
+                    if digest not in self.usage and entry.stat().st_mtime < recent:
+                        os.unlink(entry.path)
+            self.db.commit()
+
+    def get_digests(self, image_paths: list[str]) -> set[str]:
+        """Get the digests of the thumbnails that the given images are shown with"""
+        with self.lock:
+            return {
+                entry[2]
+                for entry in map(self.entries.get, map(os.path.abspath, image_paths))
+                if entry is not None
+            }
+
+    def evict(
+        self, max_bytes: int = 0, max_count: int = 0, keep: set[str] | None = None
+    ) -> None:
+        """
+        Delete the least recently shown thumbnails until the cache fits, 0 is no limit.
+        Thumbnails in keep are never deleted, so if the limit is smaller than the images
+        that are listed, the cache stays over it rather than remaking them on every scan.
+        """
+        keep = keep or set()
+        with self.lock:
+            total_bytes = sum(size for size, _ in self.usage.values())
+            count = len(self.usage)
+            evicted = set()
+            for digest, (size, _) in sorted(self.usage.items(), key=lambda item: item[1][1]):
+                if (not max_bytes or total_bytes <= max_bytes) and (
+                    not max_count or count <= max_count
+                ):
+                    break
+                if digest in keep:
+                    continue
+                evicted.add(digest)
+                total_bytes -= size
+                count -= 1
+            if evicted:
+                self.remove_thumbnails(evicted)
+                self.db.commit()
@@ -1,27 +1,47 @@
 """Module that runs the system processes to change the wallpaper"""
 
 import subprocess
+import signal
+import threading
 import time
-import screeninfo
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
 from pathlib import Path
 
 from waypaper.config import Config
+from waypaper.ipc import (
+    find_process_ids,
+    kill_processes,
+    mpv_command,
+    hyprpaper_request,
+    get_hyprpaper_socket,
+    get_swww_socket,
+    wait_for_socket,
+    wait_until,
+    wait_for_exit,
+    wait_for_idle,
+)
+from waypaper.options import get_monitor_options
+from waypaper.render import get_rendered_wallpaper
+
+# Serializes starting backend daemons and talking to them when monitors change at once:
+backend_lock = threading.Lock()
+
+
+class ChangeResult(NamedTuple):
+    """Outcome of setting a wallpaper on one monitor"""
+
+    monitor: str
+    wallpaper: Path
+    success: bool
+    seconds: float
 
 
 def find_process_id(command: str) -> Optional[int]:
-    """Find the PID of the process matching the exact command"""
-    try:
-        # TODO: Probably could work using pidof
-        result = subprocess.run(["ps", "aux"], stdout=subprocess.PIPE, text=True)
-        processes = result.stdout.splitlines()
-        for process in processes:
-            if command in process:
-                # Extract PID (second column after splitting):
-                return int(process.split()[1])
-        return None
-    except Exception:
-        return None
+    """Find the PID of the process running the program with the given arguments"""
+    name, _, arguments = command.partition(" ")
+    pids = find_process_ids(name, arguments)
+    return pids[0] if pids else None
 
 
 def seek_and_destroy(process: str, monitor: str = "All"):
@@ -29,27 +49,23 @@ def seek_and_destroy(process: str, monitor: str = "All"):
 
     # Kill all process instances if we want to set for all monitors:
     if monitor == "All":
-        try:
-            subprocess.check_output(["pgrep", f"{process}"], encoding="utf-8")
-            subprocess.Popen(["killall", f"{process}"])
-            time.sleep(0.1)
+        pids = find_process_ids(process)
+        if pids:
+            kill_processes(pids)
+            wait_for_exit(pids)
             print(f"Killed all previous instances of {process}")
-        except subprocess.CalledProcessError:
-            pass
 
     # Otherwise, find PID for certain monitor and kill it:
     else:
         if process == "mpvpaper":
-            pid = find_process_id(f"mpvpaper -f socket-{monitor}")
+            pid = find_process_id(f"mpvpaper socket-{monitor}")
         elif process == "swaybg":
             pid = find_process_id(f"swaybg -o {monitor}")
         else:
             return
-        try:
-            subprocess.run(["kill", "-9", str(pid)], check=True)
+        if pid:
+            kill_processes([pid], signal.SIGKILL)
             print(f"Detected {process} on {monitor} and killed it")
-        except Exception as e:
-            pass
 
 
 def change_with_swaybg(image_path: Path, cf: Config, monitor: str):
@@ -68,12 +84,12 @@ def change_with_swaybg(image_path: Path, cf: Config, monitor: str):
         command.extend(["-o", monitor])
     command.extend(["-i", str(image_path)])
     command.extend(["-m", fill, "-c", cf.color])
-    subprocess.Popen(command)
+    process = subprocess.Popen(command)
 
-    # Kill previous swaybg process once new wallpaper is set:
-    if pid:
-        time.sleep(0.2)
-        subprocess.run(["kill", "-9", str(pid)], check=True)
+    # Kill previous swaybg process once the new one has settled, which it does after drawing.
+    # Sleeping alone is no proof, since swaybg sleeps in its first roundtrip already:
+    if pid and wait_for_idle(process.pid, timeout=1.0):
+        kill_processes([pid], signal.SIGKILL)
 
 
 def change_with_mpvpaper(image_path: Path, cf: Config, monitor: str):
@@ -88,20 +104,15 @@ def change_with_mpvpaper(image_path: Path, cf: Config, monitor: str):
     }
     fill = fill_types[cf.fill_option.lower()]
 
-    # If mpvpaper is already active on given monitor, try to call that process in that socket:
+    # If mpvpaper is already active on given monitor, load the file through its socket:
     try:
-        subprocess.check_output(["pgrep", "-f", f"socket-{monitor}"], encoding="utf-8")
-        time.sleep(0.2)
-        print(
-            f"Detected running mpvpaper on {monitor}, now trying to call mpvpaper socket"
-        )
-        subprocess.Popen(
-            f"echo 'loadfile \"{image_path}\"' | socat - /tmp/mpv-socket-{monitor}",
-            shell=True,
-        )
+        reply = mpv_command(monitor, "loadfile", str(image_path))
+        if reply.get("error") != "success":
+            raise RuntimeError(f"mpvpaper on {monitor} failed: {reply.get('error')}")
+        print(f"Detected running mpvpaper on {monitor}, loaded the file through its socket")
 
     # If mpvpaper is not running, create a new process in a new socket:
-    except subprocess.CalledProcessError:
+    except (FileNotFoundError, ConnectionError):
         print("Detected no running mpvpaper, starting new mpvpaper process")
         command = ["mpvpaper", "--fork"]
         if cf.mpvpaper_sound:
@@ -148,11 +159,11 @@ def change_with_swww(image_path: Path, cf: Config, monitor: str):
     fill = fill_types[cf.fill_option.lower()]
 
     # Check if swww-daemon is already running. If not, launch it:
-    try:
-        subprocess.check_output(["pgrep", "swww-daemon"], encoding="utf-8")
-    except subprocess.CalledProcessError:
-        subprocess.Popen(["swww-daemon"])
-        print("Launched swww-daemon")
+    with backend_lock:
+        if not find_process_ids("swww-daemon"):
+            subprocess.Popen(["swww-daemon"])
+            print("Launched swww-daemon")
+            wait_for_socket(get_swww_socket(), timeout=2.0)
 
     command = ["swww", "img", str(image_path)]
     command.extend(["--resize", fill])
@@ -196,71 +207,157 @@ def change_with_wallutils(image_path: Path, cf: Config, monitor: str):
     subprocess.Popen(["setwallpaper", "--mode", fill, image_path])
 
 
+def start_hyprpaper() -> None:
+    """Start hyprpaper if it is not running and wait until it accepts requests"""
+    with backend_lock:
+        if not find_process_ids("hyprpaper"):
+            subprocess.Popen(["hyprpaper"])
+            wait_for_socket(get_hyprpaper_socket())
+
+
+def set_with_hyprpaper(
+    assignments: dict[str, Path], preload: list[Path] | None = None
+) -> dict[str, bool]:
+    """
+    Preload each distinct image once, assign images to monitors, then unload the images
+    that no monitor shows any more, except those preloaded ahead for the next change.
+    Returns whether each monitor accepted its wallpaper.
+    """
+    start_hyprpaper()
+    preload = preload or []
+
+    # Expand the monitors, since hyprpaper needs their names:
+    targets = {}
+    for monitor, image_path in assignments.items():
+        if monitor == "All":
+            targets.update((m, image_path) for m in get_monitor_options())
+        else:
+            targets[monitor] = image_path
+
+    with backend_lock:
+        loaded = set(hyprpaper_request("listloaded").splitlines())
+        for image_path in dict.fromkeys([*targets.values(), *preload]):
+            if str(image_path) not in loaded:
+                request = f"preload {image_path}"
+                wait_until(lambda: hyprpaper_request(request) == "ok", timeout=2.0)
+
+        # Since sometimes hyprpaper fails to change the wallpaper, we try until it replies ok:
+        successes = {}
+        for m, image_path in targets.items():
+            request = f"wallpaper {m},{image_path}"
+            successes[m] = wait_until(lambda: hyprpaper_request(request) == "ok", timeout=2.0)
+
+        # Lines of listactive look like "DP-1 = /path/to/image":
+        active = hyprpaper_request("listactive").splitlines()
+        keep = {line.partition(" = ")[2] for line in active}
+        keep.update(str(image_path) for image_path in preload)
+        for line in hyprpaper_request("listloaded").splitlines():
+            if line.startswith("/") and line not in keep:
+                hyprpaper_request(f"unload {line}")
+
+    return {
+        monitor: all(
+            success for m, success in successes.items() if monitor in ("All", m)
+        )
+        for monitor in assignments
+    }
+
+
 def change_with_hyprpaper(image_path: Path, cf: Config, monitor: str):
     """Change wallpaper with hyprpaper backend"""
+    if not set_with_hyprpaper({monitor: image_path})[monitor]:
+        raise RuntimeError(f"hyprpaper did not set the wallpaper on {monitor}")
 
-    # Check if hyprpaper is already running, otherwise start it, and preload the wallpaper:
-    try:
-        subprocess.check_output(["pgrep", "hyprpaper"], encoding="utf-8")
-    except subprocess.CalledProcessError:
-        subprocess.Popen(["hyprpaper"])
-        time.sleep(1)
-    preload_command = ["hyprctl", "hyprpaper", "preload", image_path]
 
-    # Decide which monitors are affected:
-    if monitor == "All":
-        monitors = [m.name for m in screeninfo.get_monitors()]
-    else:
-        monitors: list = [monitor]
-
-    # Change the wallpaper one by one for each affected monitor:
-    for m in monitors:
-        wallpaper_command = ["hyprctl", "hyprpaper", "wallpaper", f"{m},{image_path}"]
-        unload_command = ["hyprctl", "hyprpaper", "unload", "all"]
-        result: str = ""
-        retry_counter: int = 0
-
-        # Since sometimes hyprpaper fails to change the wallpaper, we try until success:
-        while result != "ok" and retry_counter < 10:
-            try:
-                subprocess.check_output(unload_command, encoding="utf-8").strip()
-                subprocess.check_output(preload_command, encoding="utf-8").strip()
-                result = subprocess.check_output(
-                    wallpaper_command, encoding="utf-8"
-                ).strip()
-                time.sleep(0.1)
-            except Exception:
-                retry_counter += 1
-
-
-def change_wallpaper(image_path: Path, cf: Config, monitor: str):
+def get_backend_image(image_path: Path, cf: Config, monitor: str) -> Path:
+    """Get the file to pass to the backend, which is rendered for the monitor if enabled"""
+    if not cf.render_wallpapers or cf.backend in ("none", "mpvpaper"):
+        return image_path
+    return get_rendered_wallpaper(
+        image_path, cf.cache_dir, monitor, cf.fill_option.lower(), cf.color
+    )
+
+
+def run_post_command(image_path: Path, cf: Config) -> None:
+    """Run the command that the user wants after every change of wallpaper"""
+    if cf.post_command and cf.use_post_command:
+        modified_image_path = str(image_path).replace(" ", "\\ ")
+        post_command = cf.post_command.replace("$wallpaper", modified_image_path)
+        subprocess.Popen(post_command, shell=True)
+        print(f'Executed "{post_command}" post-command\n')
+
+
+def change_wallpaper(image_path: Path, cf: Config, monitor: str) -> bool:
     """Run system commands to change the wallpaper depending on the backend"""
 
     print(f"Selected file: {image_path}")
 
     try:
+        backend_image = get_backend_image(image_path, cf, monitor)
         if cf.backend == "swaybg":
-            change_with_swaybg(image_path, cf, monitor)
+            change_with_swaybg(backend_image, cf, monitor)
         if cf.backend == "mpvpaper":
-            change_with_mpvpaper(image_path, cf, monitor)
+            change_with_mpvpaper(backend_image, cf, monitor)
         if cf.backend == "swww":
-            change_with_swww(image_path, cf, monitor)
+            change_with_swww(backend_image, cf, monitor)
         if cf.backend == "feh":
-            change_with_feh(image_path, cf, monitor)
+            change_with_feh(backend_image, cf, monitor)
         if cf.backend == "wallutils":
-            change_with_wallutils(image_path, cf, monitor)
+            change_with_wallutils(backend_image, cf, monitor)
         if cf.backend == "hyprpaper":
-            change_with_hyprpaper(image_path, cf, monitor)
+            change_with_hyprpaper(backend_image, cf, monitor)
         if cf.backend != "none":
             filename = Path(image_path).resolve().name
             print(f"Sent {cf.backend} command to set {filename} on {monitor} display\n")
-
-        # Run a post command:
-        if cf.post_command and cf.use_post_command:
-            modified_image_path = str(image_path).replace(" ", "\\ ")
-            post_command = cf.post_command.replace("$wallpaper", modified_image_path)
-            subprocess.Popen(post_command, shell=True)
-            print(f'Executed "{post_command}" post-command\n')
+        run_post_command(image_path, cf)
 
     except Exception as e:
         print(f"Error occured while changing wallpaper: \n{e}")
+        return False
+    return True
+
+
+def change_wallpapers(
+    changes: list[tuple[Path, str]], cf: Config, preload: list[Path] | None = None
+) -> list[ChangeResult]:
+    """
+    Set wallpapers on several monitors in parallel and report how each change went.
+    With hyprpaper, all monitors are set in one round and the preload images are
+    loaded ahead, so that the next change does not wait for decoding.
+    """
+    if not changes:
+        return []
+
+    if cf.backend == "hyprpaper":
+        start = time.perf_counter()
+        try:
+            assignments = {
+                monitor: get_backend_image(wallpaper, cf, monitor)
+                for wallpaper, monitor in changes
+            }
+            preload = [
+                get_backend_image(wallpaper, cf, monitor)
+                for wallpaper, (_, monitor) in zip(preload or [], changes)
+            ]
+            successes = set_with_hyprpaper(assignments, preload)
+        except Exception as e:
+            print(f"Error occured while changing wallpaper: \n{e}")
+            successes = {}
+        seconds = time.perf_counter() - start
+        results = []
+        for wallpaper, monitor in changes:
+            success = successes.get(monitor, False)
+            if success:
+                print(f"Sent hyprpaper command to set {wallpaper.name} on {monitor} display\n")
+                run_post_command(wallpaper, cf)
+            results.append(ChangeResult(monitor, wallpaper, success, seconds))
+        return results
+
+    def change(wallpaper: Path, monitor: str) -> ChangeResult:
+        start = time.perf_counter()
+        success = change_wallpaper(wallpaper, cf, monitor)
+        return ChangeResult(monitor, wallpaper, success, time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=len(changes)) as executor:
+        futures = [executor.submit(change, *arguments) for arguments in changes]
+        return [future.result() for future in futures]
@@ -0,0 +1,31 @@
+"""Module that sends commands to a running waypaperd daemon"""
+
+import os
+import json
+import socket
+from pathlib import Path
+
+
+def get_socket_path() -> Path:
+    """Get the location of the socket where waypaperd listens for commands"""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / "waypaper.sock"
+    return Path(f"/tmp/waypaper-{os.getuid()}.sock")
+
+
+def send_command(command: str, timeout: float = 30.0, **arguments) -> dict | None:
+    """Send a command to waypaperd and return its reply, or None if it is not running"""
+    request = json.dumps({"command": command, **arguments}) + "\n"
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(str(get_socket_path()))
+            client.sendall(request.encode())
+            with client.makefile("r", encoding="utf-8") as reply:
+                line = reply.readline()
+    except OSError:
+        return None
+    if not line:
+        return None
+    return json.loads(line)
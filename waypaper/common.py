@@ -1,25 +1,101 @@
 """Module with some of the common functions, like file and image operations"""
 
-import os, random, shutil, gi
-import imageio as iio
+import io, os, shutil, functools
 from pathlib import Path
-from PIL import Image
-from gi.repository import GdkPixbuf
+from concurrent.futures import Future
 
 from waypaper.consts import VIDEO_EXTENSIONS
 from waypaper.options import BackendOptions
 from waypaper.backends import Backend
+from waypaper.inventory import Inventory
+from waypaper.scanner import get_max_depth
+from waypaper.shuffle import ShuffleBag
+from waypaper.video import extract_frame
+
+
+def get_backend(backend: Backend | str) -> Backend:
+    """Get the backend object, since the config may hold either the object or its name"""
+    if isinstance(backend, Backend):
+        return backend
+    for option in BackendOptions:
+        if backend in (option.backend.name.lower(), option.backend.binary_name):
+            return option.backend
+    return BackendOptions.NONE.backend
+
+
+def get_image_paths(
+    backend: Backend | str,
+    folder_list: list[Path],
+    include_subfolders: bool = False,
+    include_all_subfolders: bool = False,
+    include_hidden: bool = False,
+    only_gifs: bool = False,
+    inventory: Inventory | None = None,
+) -> list[str]:
+    """Get a list of file paths that the backend supports, depending on the filters"""
+    # With an inventory, filters are applied in memory after a quick check of the folders:
+    if inventory is not None:
+        # Only directories that can hold listed images are checked:
+        max_depth = get_max_depth(include_subfolders, include_all_subfolders)
+        inventory.refresh(folder_list, max_depth, include_hidden)
+        return inventory.query(
+            get_backend(backend),
+            folder_list,
+            include_subfolders,
+            include_all_subfolders,
+            include_hidden,
+            only_gifs,
+        )
+    return get_backend(backend).get_supported_images(
+        [str(folder) for folder in folder_list],
+        include_subfolders,
+        include_all_subfolders,
+        include_hidden,
+        only_gifs,
+    )
+
+
+def is_image_included(
+    backend: Backend | str,
+    image_path: str,
+    folder_list: list[Path],
+    include_subfolders: bool = False,
+    include_all_subfolders: bool = False,
+    include_hidden: bool = False,
+    only_gifs: bool = False,
+) -> bool:
+    """Check if the file would be listed by get_image_paths with the same filters"""
+    return any(
+        get_backend(backend).is_image_included(
+            image_path,
+            str(folder),
+            include_subfolders,
+            include_all_subfolders,
+            include_hidden,
+            only_gifs,
+        )
+        for folder in folder_list
+    )
+
 
-gi.require_version("Gtk", "3.0")
+@functools.lru_cache(maxsize=64)
+def get_folder_name(folder: str) -> str:
+    """Get the name of the folder that symlinks lead to, remembered since it rarely changes"""
+    return Path(folder).resolve().name
 
 
 def get_image_name(full_path: str, base_folders: list[Path], include_path: bool) -> str:
     """Get image name that may or may not include parent folders"""
-    resolved_path: Path = Path(full_path).resolve()
-
     if not include_path:
-        return resolved_path.name
+        return os.path.basename(full_path)
 
+    # Listed files start with their base folder, so the name is found without resolving them:
+    for base_folder in base_folders:
+        prefix = os.path.join(str(base_folder), "")
+        if full_path.startswith(prefix):
+            return os.path.join(get_folder_name(str(base_folder)), full_path[len(prefix) :])
+
+    resolved_path: Path = Path(full_path).resolve()
     for base_folder in base_folders:
         base_folder = Path(base_folder).resolve()
         if resolved_path.is_relative_to(base_folder):
@@ -37,10 +113,13 @@ def get_random_file(
     include_all_subfolders: bool,
     cache_dir: Path,
     include_hidden: bool = False,
+    inventory: Inventory | None = None,
 ) -> str | None:
     """Pick a random file from the folder and update cache"""
     try:
-        # Get all image paths from the folder:
+        # Get all image paths from the folder inventory:
+        if inventory is None:
+            inventory = Inventory(cache_dir)
         image_paths = get_image_paths(
             backend,
             folder_list,
@@ -48,41 +127,26 @@ def get_random_file(
             include_all_subfolders,
             include_hidden,
             only_gifs=False,
+            inventory=inventory,
         )
 
-        # Read cache file with already used images:
-        cache_file = cache_dir / "used_wallpapers.txt"
-        if cache_file.exists():
-            with cache_file.open("r") as file:
-                used_images = [line.strip() for line in file.readlines()]
-        # Create it if the file does not exists:
-        else:
-            cache_file.touch()
-            used_images = []
-
-        # Pick a random image from unused images:
-        remaining_images = list(
-            filter(lambda img: img not in set(used_images), image_paths)
-        )
-        if remaining_images:
-            random_image = random.choice(remaining_images)
-            used_images.append(random_image)
-        else:
-            random_image = random.choice(image_paths)
-            used_images = [random_image]
-
-        # Write the cache file:
-        with cache_file.open("w") as file:
-            for img in used_images:
-                file.write(img + "\n")
-
-        return random_image
+        # Draw the next image from the shuffle bag, so images do not repeat:
+        return ShuffleBag(cache_dir).draw(image_paths)
 
     except Exception as e:
         print(f"Error getting random image: {e}")
         return None
 
 
+def get_next_random_files(cache_dir: Path, count: int = 1) -> list[str]:
+    """Get the files that the next calls of get_random_file will pick"""
+    try:
+        return ShuffleBag(cache_dir).peek(count)
+    except Exception as e:
+        print(f"Error getting next random images: {e}")
+        return []
+
+
 def check_installed_backends() -> list[Backend]:
     """Check which backends are installed in the system"""
     return [
@@ -92,54 +156,96 @@ def check_installed_backends() -> list[Backend]:
     ]
 
 
-def cache_image(image_path: str, cache_dir: Path) -> None:
+# Formats that Pillow can decode at reduced size faster than GdkPixbuf:
+PILLOW_EXTENSIONS = frozenset([".jpg", ".jpeg", ".jfif", ".webp"])
+
+
+def cache_image(image_path: str, cache_file: Path) -> None:
     """Create small copies of images using various libraries depending on the file type"""
+    # Imaging libraries are slow to import, so only thumbnailing pays for them:
+    from PIL import Image
+    from gi.repository import GdkPixbuf
+
     ext = os.path.splitext(image_path)[1].lower()
-    cache_file = cache_dir / Path(os.path.basename(image_path))
     width = 240
 
     try:
-        # If it's a video, extract the first frame:
+        # If it's a video, let ffmpeg extract a frame that is already scaled:
         if ext in VIDEO_EXTENSIONS:
-            reader = iio.get_reader(image_path)
-            first_frame = reader.get_data(0)
-            # Convert the numpy array to a PIL image:
-            pil_image = Image.fromarray(first_frame)
-            aspect_ratio = pil_image.height / pil_image.width
-            new_height = int(width * aspect_ratio)
-            resized_image = pil_image.resize((width, new_height))
-            resized_image.save(str(cache_file), "JPEG")
+            with Image.open(io.BytesIO(extract_frame(image_path, width))) as frame:
+                frame.save(str(cache_file), "JPEG")
             return
 
-        # If it's an image, create preview depending on the filetype
-        if ext == ".webp":
-            img = Image.open(image_path)
-            data = img.tobytes()
-            img_width, img_height = img.size
-            pixbuf = GdkPixbuf.Pixbuf.new_from_data(
-                data,
-                GdkPixbuf.Colorspace.RGB,
-                False,
-                8,
-                img_width,
-                img_height,
-                img_width * 3,
-            )
-        else:
-            pixbuf = GdkPixbuf.Pixbuf.new_from_file(str(image_path))
-        aspect_ratio = pixbuf.get_width() / pixbuf.get_height()
-        height = int(width / aspect_ratio)
-        scaled_pixbuf = pixbuf.scale_simple(
-            width, height, GdkPixbuf.InterpType.BILINEAR
-        )
-        scaled_pixbuf.savev(str(cache_file), "jpeg", [], [])
+        # Pillow decodes JPEG at a fraction of its size with draft, and reduces WebP cheaply:
+        if ext in PILLOW_EXTENSIONS:
+            with Image.open(image_path) as img:
+                height = max(1, int(width * img.height / img.width))
+                img.draft("RGB", (width, height))
+                thumbnail = img.convert("RGB").resize(
+                    (width, height), Image.Resampling.BILINEAR, reducing_gap=2.0
+                )
+            thumbnail.save(str(cache_file), "JPEG")
+            return
+
+        # Other formats are scaled by GdkPixbuf while they are loaded:
+        pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(str(image_path), width, -1, True)
+        pixbuf.savev(str(cache_file), "jpeg", [], [])
 
     # If image processing failed, create a black placeholder:
     except Exception as e:
         print(f"Could not generate preview for {os.path.basename(image_path)}")
         print(e)
-        black_pixbuf = GdkPixbuf.Pixbuf.new(
-            GdkPixbuf.Colorspace.RGB, True, 8, width, width * 9 / 16
-        )
-        black_pixbuf.fill(0x0)
-        black_pixbuf.savev(str(cache_file), "jpeg", [], [])
+        cache_placeholder(cache_file, width)
+
+
+def cache_placeholder(cache_file: Path, width: int = 240) -> None:
+    """Save a black thumbnail for images that could not be processed"""
+    from gi.repository import GdkPixbuf
+
+    black_pixbuf = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, True, 8, width, width * 9 / 16)
+    black_pixbuf.fill(0x0)
+    black_pixbuf.savev(str(cache_file), "jpeg", [], [])
+
+
+class ThumbnailPool:
+    """
+    Workers that create thumbnails as jobs are submitted, so the caller can keep finding
+    the next images while earlier ones are resized. One worker runs jobs in the caller.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self.executor = None
+        if workers > 1:
+            self.start()
+
+    def start(self) -> None:
+        """Start a new set of worker processes"""
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Forking a process with Gtk threads is unsafe, so workers start from a clean server:
+        context = multiprocessing.get_context("forkserver")
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+
+    def submit(self, image_path: str, cache_file: Path) -> Future:
+        """Start creating the thumbnail and get a future that is done when it is saved"""
+        if self.executor is not None:
+            from concurrent.futures.process import BrokenProcessPool
+
+            # A worker that crashed on a broken file takes the whole pool down with it:
+            try:
+                return self.executor.submit(cache_image, image_path, cache_file)
+            except BrokenProcessPool:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.start()
+                return self.executor.submit(cache_image, image_path, cache_file)
+        future = Future()
+        cache_image(image_path, cache_file)
+        future.set_result(None)
+        return future
+
+    def shutdown(self) -> None:
+        """Stop the workers, dropping the jobs that have not started yet"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
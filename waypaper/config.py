@@ -1,5 +1,7 @@
 """Module responsible for reading and saving the configuration and state files"""
 
+import os
+import configparser
 from configparser import ConfigParser
 from pathlib import Path
 from argparse import Namespace
@@ -43,6 +45,11 @@ class Config:
         self.backend = self.installed_backends[-1]
         self.color = "#ffffff"
         self.number_of_columns = 3
+        self.thumbnail_workers = os.cpu_count() or 1
+        # Limits of the thumbnail cache in MiB and entries, the images of the current
+        # listing are always kept, so the cache may grow past a limit smaller than them:
+        self.thumbnail_cache_size = 256
+        self.thumbnail_cache_entries = 0
 
         self.swww_transition_type = SwwwTransitionTypes.ANY
         self.swww_transition_step = 90
@@ -52,6 +59,8 @@ class Config:
 
         self.mpvpaper_sound = False
         self.mpvpaper_options = ""
+        self.hyprpaper_preload_ahead = False
+        self.render_wallpapers = False
         self.lang = "en"
         self.monitors = [self.selected_monitor]
         self.wallpapers = []
@@ -68,6 +77,7 @@ class Config:
         self.use_xdg_state = False
         self.use_post_command = True
         self.show_path_in_tooltip = True
+        self.fuzzy_search = False
 
         # Create config and cache folders:
         self.config_dir.mkdir(parents=True, exist_ok=True)
@@ -103,9 +113,28 @@ class Config:
         self.mpvpaper_options = config.get(
             "Settings", "mpvpaper_options", fallback=self.mpvpaper_options
         )
+        self.hyprpaper_preload_ahead = config.getboolean(
+            "Settings", "hyprpaper_preload_ahead", fallback=self.hyprpaper_preload_ahead
+        )
+        self.render_wallpapers = config.getboolean(
+            "Settings", "render_wallpapers", fallback=self.render_wallpapers
+        )
         self.number_of_columns = int(
             config.get("Settings", "number_of_columns", fallback=self.number_of_columns)
         )
+        self.thumbnail_workers = int(
+            config.get("Settings", "thumbnail_workers", fallback=self.thumbnail_workers)
+        )
+        self.thumbnail_cache_size = int(
+            config.get(
+                "Settings", "thumbnail_cache_size", fallback=self.thumbnail_cache_size
+            )
+        )
+        self.thumbnail_cache_entries = int(
+            config.get(
+                "Settings", "thumbnail_cache_entries", fallback=self.thumbnail_cache_entries
+            )
+        )
         self.lang = config.get("Settings", "language", fallback=self.lang)
         self.include_subfolders = config.getboolean(
             "Settings", "subfolders", fallback=self.include_subfolders
@@ -125,6 +154,9 @@ class Config:
         self.show_path_in_tooltip = config.getboolean(
             "Settings", "show_path_in_tooltip", fallback=self.show_path_in_tooltip
         )
+        self.fuzzy_search = config.getboolean(
+            "Settings", "fuzzy_search", fallback=self.fuzzy_search
+        )
 
         # Read and convert strings representing lists and paths:
         monitors_str = config.get(
@@ -196,6 +228,12 @@ class Config:
             self.swww_transition_type = "any"
         if self.number_of_columns <= 0:
             self.number_of_columns = 1
+        if self.thumbnail_workers <= 0:
+            self.thumbnail_workers = 1
+        if self.thumbnail_cache_size < 0:
+            self.thumbnail_cache_size = 0
+        if self.thumbnail_cache_entries < 0:
+            self.thumbnail_cache_entries = 0
 
         # Check validity of other swww options:
         if 0 > int(self.swww_transition_angle) > 180:
@@ -276,6 +314,7 @@ class Config:
 
         # Save the parameters into config:
         config.set("Settings", "show_path_in_tooltip", str(self.show_path_in_tooltip))
+        config.set("Settings", "fuzzy_search", str(self.fuzzy_search))
         config.set("Settings", "backend", self.backend)
         config.set("Settings", "fill", self.fill_option)
         config.set("Settings", "sort", self.sort_option)
@@ -286,6 +325,11 @@ class Config:
         config.set("Settings", "show_gifs_only", str(self.show_gifs_only))
         config.set("Settings", "post_command", self.post_command)
         config.set("Settings", "number_of_columns", str(self.number_of_columns))
+        config.set("Settings", "thumbnail_workers", str(self.thumbnail_workers))
+        config.set("Settings", "thumbnail_cache_size", str(self.thumbnail_cache_size))
+        config.set(
+            "Settings", "thumbnail_cache_entries", str(self.thumbnail_cache_entries)
+        )
         config.set("Settings", "swww_transition_type", str(self.swww_transition_type))
         config.set("Settings", "swww_transition_step", str(self.swww_transition_step))
         config.set("Settings", "swww_transition_angle", str(self.swww_transition_angle))
@@ -295,6 +339,10 @@ class Config:
         config.set("Settings", "swww_transition_fps", str(self.swww_transition_fps))
         config.set("Settings", "mpvpaper_sound", str(self.mpvpaper_sound))
         config.set("Settings", "mpvpaper_options", str(self.mpvpaper_options))
+        config.set(
+            "Settings", "hyprpaper_preload_ahead", str(self.hyprpaper_preload_ahead)
+        )
+        config.set("Settings", "render_wallpapers", str(self.render_wallpapers))
         config.set("Settings", "use_xdg_state", str(self.use_xdg_state))
 
         try:
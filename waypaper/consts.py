@@ -1,4 +1,17 @@
 VIDEO_EXTENSIONS: list[str] = ['.webm', '.mkv', '.flv', '.vob', '.ogv', '.ogg', '.rrc', '.gifv', '.mng', '.mov',
                                '.avi', '.qt', '.wmv', '.yuv', '.rm', '.asf', '.amv', '.mp4', '.m4p', '.m4v',
                                '.mpg', '.mp2', '.mpeg', '.mpe', '.mpv', '.m4v', '.svi', '.3gp', '.3g2', '.mxf',
-                               '.roq', '.nsv', '.flv', '.f4v', '.f4p', '.f4a', '.f4b', '.mod' ]
\ No newline at end of file
+                               '.roq', '.nsv', '.flv', '.f4v', '.f4p', '.f4a', '.f4b', '.mod' ]
+
+# Number of thumbnails that are added to the grid at once while the folder is processed:
+THUMBNAIL_BATCH_SIZE: int = 24
+
+# Milliseconds to wait after the last keystroke in the search field before filtering:
+SEARCH_DELAY: int = 100
+
+# Number of frames in animated previews of GIF and video wallpapers, and milliseconds per frame:
+PREVIEW_FRAMES: int = 12
+PREVIEW_FRAME_DELAY: int = 120
+
+# Number of wallpapers rendered at monitor resolution that are kept in the cache:
+RENDER_CACHE_SIZE: int = 32
@@ -0,0 +1,284 @@
+"""Module with the persistent inventory of files in the image folders"""
+
+import heapq
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import NamedTuple
+
+from waypaper.backends import Backend
+from waypaper.options import IMAGE_EXTENSIONS
+from waypaper.scanner import get_max_depth, get_path_rank
+
+
+class FileEntry(NamedTuple):
+    """A file inside an image folder"""
+
+    directory: str
+    depth: int
+    extension: str
+    hidden: bool
+    size: int
+    mtime: int
+    device: int
+    inode: int
+
+
+class DirectoryEntry(NamedTuple):
+    """A directory inside an image folder, with the modification time it was listed at"""
+
+    parent: str | None
+    depth: int
+    hidden: bool
+    mtime: int
+
+
+class FolderTree:
+    """Directories and files found under one image folder"""
+
+    def __init__(self) -> None:
+        self.directories: dict[str, DirectoryEntry] = {}
+        self.subdirectories: dict[str, list[str]] = {}
+        self.files: dict[str, FileEntry] = {}
+        self.directory_files: dict[str, list[str]] = {}
+
+        # Directories listed again or dropped since the tree was last saved:
+        self.changed: set[str] = set()
+
+    def forget_directory(self, directory: str) -> None:
+        """Drop the directory with all its files and subdirectories"""
+        self.directories.pop(directory, None)
+        for path in self.directory_files.pop(directory, []):
+            self.files.pop(path, None)
+        for subdirectory in self.subdirectories.pop(directory, []):
+            self.forget_directory(subdirectory)
+        self.changed.add(directory)
+
+    def list_directory(self, directory: str, entry: DirectoryEntry) -> None:
+        """Read the content of a directory that is new or has changed since the last time"""
+        for path in self.directory_files.get(directory, []):
+            self.files.pop(path, None)
+
+        subdirectories = []
+        files = []
+        with os.scandir(directory) as entries:
+            for item in entries:
+                hidden = entry.hidden or item.name.startswith(".")
+                try:
+                    if item.is_dir():
+                        subdirectories.append(item.path)
+                        continue
+                    extension = os.path.splitext(item.name)[1].lower()
+                    if extension not in IMAGE_EXTENSIONS:
+                        continue
+                    stat = item.stat()
+                except OSError:
+                    continue
+                self.files[item.path] = FileEntry(
+                    directory,
+                    entry.depth,
+                    extension,
+                    hidden,
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    stat.st_dev,
+                    stat.st_ino,
+                )
+                files.append(item.path)
+
+        # Subdirectories that are still there keep their content, others are dropped:
+        for subdirectory in self.subdirectories.get(directory, []):
+            if subdirectory not in subdirectories:
+                self.forget_directory(subdirectory)
+
+        self.directories[directory] = entry
+        self.subdirectories[directory] = subdirectories
+        self.directory_files[directory] = files
+        self.changed.add(directory)
+
+    def refresh(
+        self, folder: str, max_depth: int | None = None, include_hidden: bool = True
+    ) -> None:
+        """
+        Bring the tree up to date, listing again only directories whose mtime has changed.
+        Directories deeper than max_depth or hidden ones that are not included are not
+        visited, their entries are kept until a refresh that reaches them.
+        """
+        # Directories are visited by rank, so one reachable by several paths keeps its
+        # canonical one, the same that the scanner picks:
+        heap = [(get_path_rank(folder), folder, None, 0, False)]
+        visited: set[tuple[int, int]] = set()
+        while heap:
+            _, directory, parent, depth, hidden = heapq.heappop(heap)
+            try:
+                stat = os.stat(directory)
+            except OSError:
+                self.forget_directory(directory)
+                continue
+            mtime = stat.st_mtime_ns
+
+            # Directories reached again through symlinks are skipped, which also ends cycles:
+            if (stat.st_dev, stat.st_ino) in visited:
+                if directory in self.directories:
+                    self.forget_directory(directory)
+                continue
+            visited.add((stat.st_dev, stat.st_ino))
+
+            known_entry = self.directories.get(directory)
+            if known_entry is None or known_entry.mtime != mtime:
+                entry = DirectoryEntry(parent, depth, hidden, mtime)
+                try:
+                    self.list_directory(directory, entry)
+                except OSError:
+                    self.forget_directory(directory)
+                    continue
+
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for subdirectory in self.subdirectories.get(directory, []):
+                is_hidden = hidden or os.path.basename(subdirectory).startswith(".")
+                if is_hidden and not include_hidden:
+                    continue
+                rank = get_path_rank(subdirectory)
+                heapq.heappush(heap, (rank, subdirectory, directory, depth + 1, is_hidden))
+
+
+class Inventory:
+    """
+    Persistent inventory of every file under the image folders.
+    It is validated by the modification time of each directory, so that filters can be
+    applied in memory without walking the folders again.
+    """
+
+    def __init__(self, cache_dir: Path) -> None:
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(cache_dir / "inventory.db", check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS directories (folder TEXT, path TEXT, "
+            "parent TEXT, depth INTEGER, hidden INTEGER, mtime INTEGER, "
+            "PRIMARY KEY (folder, path))"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS files (folder TEXT, path TEXT, "
+            "directory TEXT, depth INTEGER, extension TEXT, hidden INTEGER, "
+            "size INTEGER, mtime INTEGER, device INTEGER, inode INTEGER, "
+            "PRIMARY KEY (folder, path))"
+        )
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS files_by_directory ON files (folder, directory)"
+        )
+        self.trees: dict[str, FolderTree] = {}
+
+    def get_tree(self, folder: str) -> FolderTree:
+        """Get the tree of the folder, loading it from the inventory file on first use"""
+        tree = self.trees.get(folder)
+        if tree is not None:
+            return tree
+
+        tree = FolderTree()
+        for path, parent, depth, hidden, mtime in self.db.execute(
+            "SELECT path, parent, depth, hidden, mtime FROM directories WHERE folder = ?",
+            (folder,),
+        ):
+            tree.directories[path] = DirectoryEntry(parent, depth, bool(hidden), mtime)
+            tree.subdirectories.setdefault(path, [])
+            tree.directory_files.setdefault(path, [])
+            if parent is not None:
+                tree.subdirectories.setdefault(parent, []).append(path)
+        for path, directory, depth, extension, hidden, size, mtime, device, inode in (
+            self.db.execute(
+                "SELECT path, directory, depth, extension, hidden, size, mtime, device, inode "
+                "FROM files WHERE folder = ?",
+                (folder,),
+            )
+        ):
+            tree.files[path] = FileEntry(
+                directory, depth, extension, bool(hidden), size, mtime, device, inode
+            )
+            tree.directory_files.setdefault(directory, []).append(path)
+        self.trees[folder] = tree
+        return tree
+
+    def refresh(
+        self, folder_list: list[Path], max_depth: int | None = None, include_hidden: bool = True
+    ) -> None:
+        """Update the inventory of the folders and save it if anything has changed"""
+        with self.lock:
+            for folder in folder_list:
+                self.get_tree(str(folder)).refresh(str(folder), max_depth, include_hidden)
+            self.save()
+
+    def save(self) -> None:
+        """Write the directories that have changed to the inventory file"""
+        for folder, tree in self.trees.items():
+            if not tree.changed:
+                continue
+            self.db.executemany(
+                "DELETE FROM directories WHERE folder = ? AND path = ?",
+                ((folder, directory) for directory in tree.changed),
+            )
+            self.db.executemany(
+                "DELETE FROM files WHERE folder = ? AND directory = ?",
+                ((folder, directory) for directory in tree.changed),
+            )
+
+            # Dropped directories only lose their rows, listed ones get them written again:
+            listed = [directory for directory in tree.changed if directory in tree.directories]
+            self.db.executemany(
+                "INSERT INTO directories VALUES (?, ?, ?, ?, ?, ?)",
+                ((folder, directory, *tree.directories[directory]) for directory in listed),
+            )
+            self.db.executemany(
+                "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (folder, path, *tree.files[path])
+                    for directory in listed
+                    for path in tree.directory_files.get(directory, [])
+                ),
+            )
+            tree.changed.clear()
+        self.db.commit()
+
+    def get_files(self, folder_list: list[Path]) -> dict[str, tuple[int, int]]:
+        """Get size and modification time of every file in the folders"""
+        with self.lock:
+            return {
+                path: (entry.size, entry.mtime)
+                for folder in folder_list
+                for path, entry in self.get_tree(str(folder)).files.items()
+            }
+
+    def query(
+        self,
+        backend: Backend,
+        folder_list: list[Path],
+        include_subfolders: bool = False,
+        include_all_subfolders: bool = False,
+        include_hidden: bool = False,
+        only_gifs: bool = False,
+    ) -> list[str]:
+        """
+        Get paths of files that pass the filters, without touching the disk. Files reachable
+        through several paths, like symlinks or overlapping folders, are listed once.
+        """
+        max_depth = get_max_depth(include_subfolders, include_all_subfolders)
+        extensions = frozenset(backend.allowed_extensions)
+
+        paths: dict[tuple[int, int], str] = {}
+        with self.lock:
+            for folder in folder_list:
+                for path, entry in self.get_tree(str(folder)).files.items():
+                    if max_depth is not None and entry.depth > max_depth:
+                        continue
+                    if entry.hidden and not include_hidden:
+                        continue
+                    if entry.extension not in extensions:
+                        continue
+                    if only_gifs and entry.extension != ".gif":
+                        continue
+                    key = (entry.device, entry.inode)
+                    known_path = paths.get(key)
+                    if known_path is None or get_path_rank(path) < get_path_rank(known_path):
+                        paths[key] = path
+        return list(paths.values())
@@ -0,0 +1,282 @@
+"""Module that talks to backend processes directly, without spawning helper programs"""
+
+import os
+import json
+import signal
+import socket
+import threading
+import time
+import itertools
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from pathlib import Path
+from typing import Any, Callable
+
+
+def find_process_ids(name: str, pattern: str = "") -> list[int]:
+    """Find processes by executable name and a substring of their command line, using /proc"""
+    own_pid = os.getpid()
+    pids = []
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit() or int(entry.name) == own_pid:
+            continue
+        try:
+            with open(os.path.join(entry.path, "cmdline"), "rb") as file:
+                arguments = file.read().rstrip(b"\0").split(b"\0")
+        except OSError:
+            continue
+        if os.path.basename(os.fsdecode(arguments[0])) != name:
+            continue
+        if pattern and pattern not in " ".join(map(os.fsdecode, arguments)):
+            continue
+        pids.append(int(entry.name))
+    return pids
+
+
+def kill_processes(pids: list[int], sig: int = signal.SIGTERM) -> None:
+    """Send a signal to the processes, ignoring those that are already gone"""
+    for pid in pids:
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+
+def is_socket_listening(socket_path: Path) -> bool:
+    """Check if some process accepts connections on the Unix socket"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(socket_path))
+        return True
+    except OSError:
+        return False
+
+
+def wait_until(condition: Callable[[], Any], timeout: float) -> bool:
+    """Poll the condition with growing intervals until it holds or the time is out"""
+    deadline = time.monotonic() + timeout
+    interval = 0.002
+    while True:
+        try:
+            if condition():
+                return True
+        except OSError:
+            pass
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, 0.1)
+
+
+def get_process_sample(pid: int) -> tuple[str, int] | None:
+    """Get the scheduler state letter and the CPU ticks used by the process, None if it is gone"""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as file:
+            stat = file.read()
+    except OSError:
+        return None
+    # The fields follow the command name, which is in parentheses and may contain spaces:
+    fields = stat[stat.rindex(b")") + 2 :].split()
+    state = fields[0].decode()
+    if state in ("Z", "X"):
+        return None
+    return state, int(fields[11]) + int(fields[12])
+
+
+def get_process_state(pid: int) -> str | None:
+    """Get the scheduler state letter of the process, or None if it is gone"""
+    sample = get_process_sample(pid)
+    return sample[0] if sample else None
+
+
+def wait_for_exit(pids: list[int], timeout: float = 1.0) -> bool:
+    """Wait until the processes are gone from /proc"""
+    return wait_until(lambda: all(get_process_state(pid) is None for pid in pids), timeout)
+
+
+def wait_for_idle(
+    pid: int, minimum: float = 0.2, settle: float = 0.05, timeout: float = 1.0
+) -> bool:
+    """
+    Wait until the process has slept without using CPU for the settle time, and at least
+    the minimum time. A process that draws and then waits for events has most likely
+    drawn by then, but there is no real signal for it. False if the process exited.
+    """
+    start = time.monotonic()
+    last_sample = None
+    last_change = start
+
+    def is_settled() -> bool:
+        nonlocal last_sample, last_change
+        now = time.monotonic()
+        sample = get_process_sample(pid)
+        if sample is None:
+            return True
+        if sample != last_sample or sample[0] != "S":
+            last_sample, last_change = sample, now
+            return False
+        return now - last_change >= settle and now - start >= minimum
+
+    wait_until(is_settled, timeout)
+    return get_process_state(pid) is not None
+
+
+def wait_for_socket(socket_path: Path, timeout: float = 5.0) -> bool:
+    """Wait until some process accepts connections on the Unix socket"""
+    return wait_until(lambda: is_socket_listening(socket_path), timeout)
+
+
+def get_runtime_dir() -> Path:
+    return Path(os.environ.get("XDG_RUNTIME_DIR", f"/run/user/{os.getuid()}"))
+
+
+def get_hyprpaper_socket() -> Path:
+    """Get the request socket of hyprpaper for the current Hyprland instance"""
+    signature = os.environ.get("HYPRLAND_INSTANCE_SIGNATURE", "")
+    candidates = [
+        get_runtime_dir() / "hypr" / signature / ".hyprpaper.sock",
+        Path("/tmp/hypr") / signature / ".hyprpaper.sock",
+    ]
+    for candidate in candidates:
+        if candidate.exists():
+            return candidate
+    return candidates[0]
+
+
+def hyprpaper_request(request: str, timeout: float = 5.0) -> str:
+    """Send a request like 'preload <path>' to hyprpaper and return its reply"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(str(get_hyprpaper_socket()))
+        client.sendall(request.encode())
+
+        # hyprpaper closes the connection after the reply, which may be long for lists:
+        reply = b""
+        while chunk := client.recv(4096):
+            reply += chunk
+        return reply.decode(errors="replace").strip()
+
+
+def get_swww_socket() -> Path:
+    """Get the socket of swww-daemon, whose name depends on the swww version"""
+    runtime_dir = get_runtime_dir()
+    wayland_display = os.environ.get("WAYLAND_DISPLAY", "wayland-0")
+    candidates = [
+        runtime_dir / f"{wayland_display}-swww-daemon..sock",
+        runtime_dir / f"swww-{wayland_display}.socket",
+        runtime_dir / "swww.socket",
+    ]
+    for candidate in candidates:
+        if candidate.exists():
+            return candidate
+    return candidates[0]
+
+
+def get_mpv_socket(monitor: str) -> Path:
+    """Get the JSON IPC socket that mpvpaper is started with for the monitor"""
+    return Path(f"/tmp/mpv-socket-{monitor}")
+
+
+class MpvConnection:
+    """
+    Persistent connection to the JSON IPC socket of one mpv process. Commands are
+    pipelined with request ids, a reader thread matches replies to them, and a lost
+    connection is opened again on next use.
+    """
+
+    def __init__(self, socket_path: Path) -> None:
+        self.socket_path = socket_path
+        self.lock = threading.Lock()
+        self.client: socket.socket | None = None
+        self.request_ids = itertools.count(1)
+        self.pending: dict[int, Future] = {}
+
+    def connect(self) -> socket.socket:
+        """Open the socket and start reading from it, unless it is already open"""
+        if self.client is None:
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                client.connect(str(self.socket_path))
+            except OSError:
+                client.close()
+                raise
+            self.client = client
+            threading.Thread(target=self.read, args=(client,), daemon=True).start()
+        return self.client
+
+    def disconnect(self, client: socket.socket) -> None:
+        """Close the socket and fail the commands that still wait for replies"""
+        with self.lock:
+            if self.client is client:
+                self.client = None
+            pending, self.pending = self.pending, {}
+        client.close()
+        for future in pending.values():
+            future.set_exception(ConnectionError(f"Lost connection to {self.socket_path}"))
+
+    def read(self, client: socket.socket) -> None:
+        """Dispatch replies until mpv closes the socket, events are not used"""
+        try:
+            with client.makefile("r", encoding="utf-8") as lines:
+                for line in lines:
+                    try:
+                        message = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if "request_id" not in message or "event" in message:
+                        continue
+                    with self.lock:
+                        future = self.pending.pop(message["request_id"], None)
+                    if future is not None:
+                        future.set_result(message)
+        except (OSError, ValueError):
+            pass
+        self.disconnect(client)
+
+    def send(self, command: tuple) -> tuple[int, Future]:
+        """Write the command and get its request id with the future of its reply"""
+        with self.lock:
+            client = self.connect()
+            request_id = next(self.request_ids)
+            future = Future()
+            self.pending[request_id] = future
+            request = json.dumps({"command": list(command), "request_id": request_id})
+            try:
+                client.sendall((request + "\n").encode())
+            except OSError:
+                self.pending.pop(request_id, None)
+                raise
+        return request_id, future
+
+    def command(self, *command: str | int | float, timeout: float = 2.0) -> dict:
+        """Send a command and wait for its reply, connecting again once if the socket broke"""
+        try:
+            request_id, future = self.send(command)
+        except (BrokenPipeError, ConnectionResetError):
+            if self.client is not None:
+                self.disconnect(self.client)
+            request_id, future = self.send(command)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            # A late reply is dropped, the future would be kept forever otherwise:
+            with self.lock:
+                self.pending.pop(request_id, None)
+            raise TimeoutError(f"mpv on {self.socket_path} did not reply to {command}")
+
+
+mpv_connections: dict[str, MpvConnection] = {}
+mpv_connections_lock = threading.Lock()
+
+
+def get_mpv_connection(monitor: str) -> MpvConnection:
+    """Get the shared connection to mpv on the monitor"""
+    with mpv_connections_lock:
+        if monitor not in mpv_connections:
+            mpv_connections[monitor] = MpvConnection(get_mpv_socket(monitor))
+        return mpv_connections[monitor]
+
+
+def mpv_command(monitor: str, *command: str | int | float, timeout: float = 2.0) -> dict:
+    """Send a command to mpv on the monitor and return its reply"""
+    return get_mpv_connection(monitor).command(*command, timeout=timeout)
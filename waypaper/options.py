@@ -1,13 +1,22 @@
 """Module that contains lists of possible options used in the application"""
 
-from screeninfo import get_monitors
+from enum import Enum
 
-MONITOR_OPTIONS: list[str | None] = [m.name for m in get_monitors()]
+from waypaper.backends import *
 
 
-from enum import Enum
+def get_monitor_options() -> list[str]:
+    """Get names of connected monitors. Probing is slow, so it is done only when needed"""
+    from screeninfo import get_monitors
+
+    return [m.name for m in get_monitors()]
 
-from waypaper.backends import *
+
+def get_monitor_geometries() -> dict[str, tuple[int, int]]:
+    """Get the resolution of each connected monitor by its name"""
+    from screeninfo import get_monitors
+
+    return {m.name: (m.width, m.height) for m in get_monitors()}
 
 
 class ArgsEnum(Enum):
@@ -31,6 +40,12 @@ class BackendOptions(ArgsEnum):
     MPVPAPER = MpvPaperBackend()
 
 
+# Extensions of files that any backend can set, other files are not even listed:
+IMAGE_EXTENSIONS = frozenset(
+    extension for option in BackendOptions for extension in option.backend.allowed_extensions
+)
+
+
 class FillOptions(Enum):
     FILL = "fill"
     STRETCH = "stretch"
@@ -0,0 +1,58 @@
+"""Module that makes animated previews of GIF and video wallpapers as strips of frames"""
+
+import io
+import os
+from pathlib import Path
+
+from waypaper.consts import VIDEO_EXTENSIONS, PREVIEW_FRAMES
+from waypaper.video import extract_frames
+
+ANIMATED_EXTENSIONS = frozenset([*VIDEO_EXTENSIONS, ".gif"])
+
+
+def is_animated(image_path: str) -> bool:
+    return os.path.splitext(image_path)[1].lower() in ANIMATED_EXTENSIONS
+
+
+def make_preview(image_path: str, preview_file: Path, width: int = 240) -> None:
+    """Save frames of the animation side by side in one image, each frame of the given width"""
+    from PIL import Image
+
+    if image_path.lower().endswith(".gif"):
+        frames = []
+        with Image.open(image_path) as img:
+            height = max(1, int(width * img.height / img.width))
+            count = getattr(img, "n_frames", 1)
+            picks = sorted(
+                {n * (count - 1) // max(1, PREVIEW_FRAMES - 1) for n in range(PREVIEW_FRAMES)}
+            )
+            for n in picks:
+                img.seek(n)
+                frame = img.convert("RGB").resize(
+                    (width, height), Image.Resampling.BILINEAR, reducing_gap=2.0
+                )
+                frames.append(frame)
+    else:
+        ppm_frames = extract_frames(image_path, width, PREVIEW_FRAMES)
+        frames = [Image.open(io.BytesIO(ppm)) for ppm in ppm_frames]
+
+    strip = Image.new("RGB", (width * len(frames), frames[0].height))
+    for n, frame in enumerate(frames):
+        strip.paste(frame, (n * width, 0))
+
+    # Write to a temporary file first, so the grid never loads a half written strip:
+    temporary_file = preview_file.with_suffix(f".{os.getpid()}.tmp")
+    strip.save(temporary_file, "JPEG")
+    os.replace(temporary_file, preview_file)
+
+
+def load_preview(preview_file: Path, width: int = 240) -> list:
+    """Cut the strip into frames, which share the pixels of the strip"""
+    from gi.repository import GdkPixbuf
+
+    strip = GdkPixbuf.Pixbuf.new_from_file(str(preview_file))
+    height = strip.get_height()
+    return [
+        strip.new_subpixbuf(x, 0, width, height)
+        for x in range(0, strip.get_width() - width + 1, width)
+    ]
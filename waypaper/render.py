@@ -0,0 +1,118 @@
+"""Module that renders wallpapers at the exact resolution of monitors, so backends do not scale them"""
+
+import os
+import hashlib
+import threading
+from pathlib import Path
+
+from waypaper.cache import get_file_digest
+from waypaper.consts import VIDEO_EXTENSIONS, RENDER_CACHE_SIZE
+from waypaper.options import FillOptions, get_monitor_geometries
+
+# Animated and video wallpapers are passed to backends as they are:
+SKIPPED_EXTENSIONS = frozenset([*VIDEO_EXTENSIONS, ".gif"])
+
+geometries: dict[str, tuple[int, int]] | None = None
+
+
+def get_geometry(monitor: str) -> tuple[int, int] | None:
+    """Get the resolution of the monitor, or of all monitors if they share it"""
+    global geometries
+
+    # Monitors are probed again when one is not known, since they may be plugged in later:
+    if geometries is None or (monitor != "All" and monitor not in geometries):
+        geometries = get_monitor_geometries()
+    if monitor != "All":
+        return geometries.get(monitor)
+    sizes = set(geometries.values())
+    return sizes.pop() if len(sizes) == 1 else None
+
+
+def get_render_path(
+    render_dir: Path, image_path: Path, geometry: tuple[int, int], fill: str, color: str
+) -> Path:
+    """Get the cache file of the render, keyed by the source contents and the render options"""
+    digest = get_file_digest(str(image_path), os.path.getsize(image_path))
+    key = f"{digest}\0{geometry[0]}x{geometry[1]}\0{fill}\0{color}"
+    return render_dir / (hashlib.blake2b(key.encode(), digest_size=16).hexdigest() + ".jpg")
+
+
+def render_image(
+    image_path: Path, render_path: Path, geometry: tuple[int, int], fill: str, color: str
+) -> None:
+    """Crop and scale the image to the monitor like the backend would for the fill option"""
+    from PIL import Image
+
+    width, height = geometry
+    with Image.open(image_path) as source:
+        # Let the JPEG decoder skip detail that will be scaled away anyway, but center
+        # and tile paste the image as it is:
+        if fill in (FillOptions.FILL.value, FillOptions.FIT.value, FillOptions.STRETCH.value):
+            source.draft("RGB", geometry)
+        image = source.convert("RGB")
+
+    canvas = Image.new("RGB", geometry, color)
+    if fill == FillOptions.FILL.value:
+        scale = max(width / image.width, height / image.height)
+    elif fill == FillOptions.FIT.value:
+        scale = min(width / image.width, height / image.height)
+    else:
+        scale = 1.0
+
+    if fill == FillOptions.STRETCH.value:
+        canvas = image.resize(geometry, Image.Resampling.LANCZOS)
+    elif fill == FillOptions.TILE.value:
+        for x in range(0, width, image.width):
+            for y in range(0, height, image.height):
+                canvas.paste(image, (x, y))
+    else:
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        if size != image.size:
+            image = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        canvas.paste(image, ((width - size[0]) // 2, (height - size[1]) // 2))
+
+    # Write to a temporary file first, so a backend never reads a half written render:
+    temporary_path = render_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    canvas.save(temporary_path, "JPEG", quality=95)
+    os.replace(temporary_path, render_path)
+
+
+def prune_renders(render_dir: Path, keep: int = RENDER_CACHE_SIZE) -> None:
+    """Delete the least recently used renders beyond the given number"""
+    renders = []
+    for entry in os.scandir(render_dir):
+        try:
+            renders.append((entry.stat().st_mtime, entry.path))
+        except FileNotFoundError:
+            continue
+    renders.sort(reverse=True)
+    for _, render_path in renders[keep:]:
+        Path(render_path).unlink(missing_ok=True)
+
+
+def get_rendered_wallpaper(
+    image_path: Path, cache_dir: Path, monitor: str, fill: str, color: str
+) -> Path:
+    """Get the wallpaper rendered for the monitor, rendering it if it is not cached yet"""
+    if Path(image_path).suffix.lower() in SKIPPED_EXTENSIONS:
+        return image_path
+    geometry = get_geometry(monitor)
+    if geometry is None:
+        return image_path
+
+    render_dir = cache_dir / "rendered"
+    render_dir.mkdir(parents=True, exist_ok=True)
+    render_path = get_render_path(render_dir, image_path, geometry, fill, color)
+
+    # Touch cached renders, so that pruning deletes the least recently used ones:
+    if render_path.exists():
+        os.utime(render_path)
+        return render_path
+
+    try:
+        render_image(image_path, render_path, geometry, fill, color)
+    except Exception as e:
+        print(f"Could not render {image_path} for {monitor}: {e}")
+        return image_path
+    prune_renders(render_dir)
+    return render_path
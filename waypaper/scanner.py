@@ -0,0 +1,114 @@
+"""Module that lists image files in folders in a single pass over directory entries"""
+
+import heapq
+import os
+from typing import Iterable, Iterator, NamedTuple
+
+
+class ScanEntry(NamedTuple):
+    """An image file with the stat fields that the directory listing provided"""
+
+    path: str
+    size: int
+    mtime: int
+    inode: int
+    device: int
+
+
+def get_max_depth(include_subfolders: bool, include_all_subfolders: bool) -> int | None:
+    """Get how deep below the folder images are listed, None meaning without limit"""
+    if not include_subfolders:
+        return 0
+    return None if include_all_subfolders else 1
+
+
+def get_path_rank(path: str) -> tuple[int, str]:
+    """Rank paths of the same file, the shallowest and then alphabetically first one is canonical"""
+    return path.count(os.sep), path
+
+
+def walk_folder(
+    folder: str, max_depth: int | None = None, include_hidden: bool = False
+) -> Iterator[tuple[str, int, list[os.DirEntry]]]:
+    """
+    Yield every directory under the folder with its depth and the entries that are not
+    directories. Symlinks are followed, but each physical directory is entered only once,
+    so symlink cycles end and the work is bounded by the number of real directories.
+    Directories are visited in the order of get_path_rank, so a directory reachable by
+    several paths is always entered by its canonical one.
+    """
+    heap = [(get_path_rank(folder), folder, 0)]
+    visited: set[tuple[int, int]] = set()
+    while heap:
+        _, directory, depth = heapq.heappop(heap)
+        try:
+            stat = os.stat(directory)
+        except OSError:
+            continue
+        if (stat.st_dev, stat.st_ino) in visited:
+            continue
+        visited.add((stat.st_dev, stat.st_ino))
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        with entries:
+            files = []
+            for entry in entries:
+                if not include_hidden and entry.name.startswith("."):
+                    continue
+                try:
+                    if not entry.is_dir():
+                        files.append(entry)
+                        continue
+                except OSError:
+                    continue
+                if max_depth is None or depth < max_depth:
+                    heapq.heappush(heap, (get_path_rank(entry.path), entry.path, depth + 1))
+        yield directory, depth, files
+
+
+def scan_folder(
+    folder: str,
+    extensions: frozenset[str],
+    max_depth: int | None = 0,
+    include_hidden: bool = False,
+) -> Iterator[ScanEntry]:
+    """
+    List files with the extensions under the folder. Directories deeper than max_depth
+    are never opened, and files with other extensions are skipped before their stat.
+    """
+    for _, _, files in walk_folder(folder, max_depth, include_hidden):
+        for entry in files:
+            if os.path.splitext(entry.name)[1].lower() not in extensions:
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            yield ScanEntry(
+                entry.path, stat.st_size, stat.st_mtime_ns, stat.st_ino, stat.st_dev
+            )
+
+
+def get_unique_entries(entries: Iterable[ScanEntry]) -> list[ScanEntry]:
+    """Keep one entry per physical file, under its canonical path, in the order first found"""
+    unique: dict[tuple[int, int], ScanEntry] = {}
+    for entry in entries:
+        key = (entry.device, entry.inode)
+        known = unique.get(key)
+        if known is None or get_path_rank(entry.path) < get_path_rank(known.path):
+            unique[key] = entry
+    return list(unique.values())
+
+
+def stat_files(paths: Iterable[str]) -> dict[str, tuple[int, int]]:
+    """Get size and modification time of the files that still exist"""
+    files = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        files[path] = (stat.st_size, stat.st_mtime_ns)
+    return files
@@ -0,0 +1,96 @@
+"""Module with the index that is used to search images by their names"""
+
+from array import array
+from typing import Iterable
+
+
+def get_trigrams(text: str) -> set[str]:
+    """Get all three-character substrings of the text"""
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def get_fuzzy_score(query: str, name: str) -> int | None:
+    """Score how well the query matches the name as a subsequence, or None if it does not"""
+    score = 0
+    position = 0
+    previous_match = -2
+    for char in query:
+        position = name.find(char, position)
+        if position == -1:
+            return None
+
+        # Reward consecutive characters and matches at the start of words:
+        if position == previous_match + 1:
+            score += 3
+        if position == 0 or not name[position - 1].isalnum():
+            score += 2
+        score += 1
+        previous_match = position
+        position += 1
+
+    # Prefer shorter names among equally good matches:
+    return score * 1000 - len(name)
+
+
+class SearchIndex:
+    """Index of lowercased image names with trigram postings for fast substring search"""
+
+    def __init__(self, names: Iterable[str] = ()) -> None:
+        self.names: list[str] = []
+        self.trigrams: dict[str, array] = {}
+        for name in names:
+            self.add(name)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, name: str) -> int:
+        """Add a name to the index and return its position"""
+        index = len(self.names)
+        lowered_name = name.lower()
+        self.names.append(lowered_name)
+        for trigram in get_trigrams(lowered_name):
+            postings = self.trigrams.get(trigram)
+            if postings is None:
+                postings = self.trigrams[trigram] = array("I")
+            postings.append(index)
+        return index
+
+    def get_candidates(self, query: str) -> Iterable[int]:
+        """Get positions that may contain the query, using the rarest of its trigrams"""
+        query_trigrams = get_trigrams(query)
+        if not query_trigrams:
+            return range(len(self.names))
+        postings = [self.trigrams.get(trigram, array("I")) for trigram in query_trigrams]
+        return min(postings, key=len)
+
+    def matches(self, query: str, index: int, fuzzy: bool = False) -> bool:
+        """Check if the name at the given position matches the query"""
+        query = query.lower()
+        if fuzzy:
+            return get_fuzzy_score(query, self.names[index]) is not None
+        return query in self.names[index]
+
+    def search(
+        self, query: str, within: array | None = None, fuzzy: bool = False
+    ) -> array:
+        """
+        Get an array of positions of names that match the query, in their original order.
+        If within is given, only those positions are considered, which allows to narrow
+        the previous results when the query grows. Fuzzy search ranks subsequence matches.
+        """
+        query = query.lower()
+        if not query:
+            return array("I", range(len(self.names))) if within is None else within
+
+        if fuzzy:
+            candidates = range(len(self.names)) if within is None else within
+            scores = {}
+            for index in candidates:
+                score = get_fuzzy_score(query, self.names[index])
+                if score is not None:
+                    scores[index] = score
+            return array("I", sorted(scores, key=lambda index: -scores[index]))
+
+        candidates = self.get_candidates(query) if within is None else within
+        return array("I", (index for index in candidates if query in self.names[index]))
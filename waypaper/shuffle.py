@@ -0,0 +1,110 @@
+"""Module with the shuffle bag that picks random wallpapers without repeats"""
+
+import os
+import random
+import sqlite3
+import zlib
+from pathlib import Path
+
+
+def get_fingerprint(image_paths: list[str]) -> int:
+    """Get a checksum of the set of paths that does not depend on their order"""
+    checksum = sum(zlib.crc32(os.fsencode(path)) for path in image_paths)
+
+    # Keep within 63 bits, since SQLite integers are signed 64-bit:
+    return (checksum * 1_000_003 + len(image_paths)) % (1 << 63)
+
+
+class ShuffleBag:
+    """
+    Persistent random order of wallpapers with a cursor, so every image is drawn once
+    before any image repeats. Drawing reads one row and updates the cursor, and the bag
+    is reconciled with added or removed files instead of being shuffled again.
+    """
+
+    def __init__(self, cache_dir: Path) -> None:
+
+        # The bag replaces the list of used wallpapers that older versions kept:
+        if not (cache_dir / "shuffle_bag.db").exists():
+            try:
+                (cache_dir / "used_wallpapers.txt").unlink(missing_ok=True)
+            except OSError:
+                pass
+        self.db = sqlite3.connect(cache_dir / "shuffle_bag.db")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS bag (position INTEGER PRIMARY KEY, path TEXT UNIQUE)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER)"
+        )
+
+    def get_state(self, key: str) -> int:
+        row = self.db.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def set_state(self, key: str, value: int) -> None:
+        self.db.execute("INSERT OR REPLACE INTO state VALUES (?, ?)", (key, value))
+
+    def shuffle(self, image_paths: list[str]) -> None:
+        """Fill the bag with all images in a new random order"""
+        self.db.execute("DELETE FROM bag")
+        self.db.executemany(
+            "INSERT INTO bag VALUES (?, ?)",
+            enumerate(random.sample(image_paths, len(image_paths))),
+        )
+        self.set_state("cursor", 0)
+        self.set_state("fingerprint", get_fingerprint(image_paths))
+
+    def reconcile(self, image_paths: list[str]) -> None:
+        """Drop images that are gone and put new ones at random places among the undrawn"""
+        fingerprint = get_fingerprint(image_paths)
+        if fingerprint == self.get_state("fingerprint"):
+            return
+
+        bag_paths = {path for (path,) in self.db.execute("SELECT path FROM bag")}
+        current_paths = set(image_paths)
+        self.db.executemany(
+            "DELETE FROM bag WHERE path = ?",
+            ((path,) for path in bag_paths - current_paths),
+        )
+
+        # Insert each new image at a random undrawn position, moving its occupant to the end:
+        cursor = self.get_state("cursor")
+        end = (self.db.execute("SELECT MAX(position) FROM bag").fetchone()[0] or 0) + 1
+
+        # Drawn images may have been removed from the end, so the cursor can be past it:
+        end = max(end, cursor)
+        for path in image_paths:
+            if path in bag_paths:
+                continue
+            position = random.randint(cursor, end)
+            self.db.execute(
+                "UPDATE bag SET position = ? WHERE position = ?", (end, position)
+            )
+            self.db.execute("INSERT INTO bag VALUES (?, ?)", (position, path))
+            end += 1
+        self.set_state("fingerprint", fingerprint)
+
+    def peek(self, count: int = 1) -> list[str]:
+        """Get the images that the next draws will return, without drawing them"""
+        query = "SELECT path FROM bag WHERE position >= ? ORDER BY position LIMIT ?"
+        rows = self.db.execute(query, (self.get_state("cursor"), count))
+        return [path for (path,) in rows]
+
+    def draw(self, image_paths: list[str]) -> str | None:
+        """Get the next image from the bag, shuffling again once every image was drawn"""
+        try:
+            self.reconcile(image_paths)
+            query = "SELECT position, path FROM bag WHERE position >= ? ORDER BY position LIMIT 1"
+            row = self.db.execute(query, (self.get_state("cursor"),)).fetchone()
+            if row is None:
+                self.shuffle(image_paths)
+                row = self.db.execute(query, (0,)).fetchone()
+            if row is not None:
+                self.set_state("cursor", row[0] + 1)
+        except Exception:
+            # Do not leave a half written bag behind:
+            self.db.rollback()
+            raise
+        self.db.commit()
+        return row[1] if row else None
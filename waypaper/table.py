@@ -0,0 +1,93 @@
+"""Module with the compact table of images that are shown in the grid"""
+
+import os
+from array import array
+from typing import Iterator
+
+from waypaper.preview import is_animated
+
+# Bits of the flags column:
+ANIMATED = 1
+
+
+class ImageTable:
+    """
+    Images of the grid stored by columns. Each path is split into an interned directory
+    and a file name, and sizes, modification times and flags live in typed arrays, so a
+    row costs a few bytes besides its name and thumbnail. Rows are addressed by position,
+    and views of the table are arrays of positions.
+    """
+
+    def __init__(self) -> None:
+        self.directories: list[str] = []
+        self.directory_ids: dict[str, int] = {}
+        self.directory_column = array("I")
+        self.names: list[str] = []
+        self.sizes = array("q")
+        self.mtimes = array("q")
+        self.flags = array("B")
+        self.thumbnails: list = []
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def get_directory_id(self, directory: str) -> int:
+        """Get the number of the directory, adding it to the interned ones if it is new"""
+        directory_id = self.directory_ids.get(directory)
+        if directory_id is None:
+            directory_id = len(self.directories)
+            self.directories.append(directory)
+            self.directory_ids[directory] = directory_id
+        return directory_id
+
+    def insert(self, index: int, path: str, size: int, mtime: int, thumbnail) -> None:
+        """Insert an image at the given position"""
+        directory, name = os.path.split(path)
+        self.directory_column.insert(index, self.get_directory_id(directory))
+        self.names.insert(index, name)
+        self.sizes.insert(index, size)
+        self.mtimes.insert(index, mtime)
+        self.flags.insert(index, ANIMATED if is_animated(name) else 0)
+        self.thumbnails.insert(index, thumbnail)
+
+    def append(self, path: str, size: int, mtime: int, thumbnail) -> int:
+        """Add an image at the end and return its position"""
+        index = len(self)
+        self.insert(index, path, size, mtime, thumbnail)
+        return index
+
+    def delete(self, index: int) -> None:
+        """Remove the image at the given position"""
+        del self.directory_column[index]
+        del self.names[index]
+        del self.sizes[index]
+        del self.mtimes[index]
+        del self.flags[index]
+        del self.thumbnails[index]
+
+    def get_path(self, index: int) -> str:
+        """Join the directory and the name of the image back into its path"""
+        return os.path.join(self.directories[self.directory_column[index]], self.names[index])
+
+    def iter_paths(self) -> Iterator[str]:
+        for index in range(len(self)):
+            yield self.get_path(index)
+
+    def is_animated(self, index: int) -> bool:
+        return bool(self.flags[index] & ANIMATED)
+
+    def find(self, paths: set[str]) -> array:
+        """Get positions of the images with the given paths, comparing without joining paths"""
+        keys = set()
+        for path in paths:
+            directory, name = os.path.split(path)
+            if directory in self.directory_ids:
+                keys.add((self.directory_ids[directory], name))
+        return array(
+            "I",
+            (
+                index
+                for index, key in enumerate(zip(self.directory_column, self.names))
+                if key in keys
+            ),
+        )
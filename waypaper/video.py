@@ -0,0 +1,110 @@
+"""Module that extracts preview frames from videos with ffmpeg"""
+
+import re
+import shutil
+import subprocess
+
+# Seconds into the video where the preview is taken, since the first frame is often black:
+SEEK_POSITION = 1.0
+
+# Seconds that ffmpeg may take for one file before it is killed:
+FFMPEG_TIMEOUT = 10.0
+
+# Seconds from the start of the video that animated previews are sampled from:
+PREVIEW_SPAN = 6.0
+
+PPM_HEADER = re.compile(rb"P6\s+(\d+)\s+(\d+)\s+\d+\s")
+
+
+def get_ffmpeg_binary() -> str:
+    """Get the ffmpeg bundled with imageio-ffmpeg, or the one installed in the system"""
+    try:
+        from imageio_ffmpeg import get_ffmpeg_exe
+
+        return get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        return shutil.which("ffmpeg") or "ffmpeg"
+
+
+def run_ffmpeg(command: list[str], timeout: float) -> bytes:
+    """Run ffmpeg and return its output, making sure that the process does not outlive the call"""
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        output, errors = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise TimeoutError(f"ffmpeg took longer than {timeout} seconds")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(errors.decode(errors="replace").strip())
+    return output
+
+
+def extract_frame(video_path: str, width: int, timeout: float = FFMPEG_TIMEOUT) -> bytes:
+    """
+    Get one frame of the video scaled to the width, as a binary PPM image. The input is
+    seeked to the nearest keyframe, and ffmpeg scales the frame before piping it raw.
+    """
+    for position in (SEEK_POSITION, 0.0):
+        command = [
+            get_ffmpeg_binary(),
+            "-nostdin",
+            "-loglevel", "error",
+            "-noaccurate_seek",
+            "-ss", str(position),
+            "-i", video_path,
+            "-an", "-sn",
+            "-frames:v", "1",
+            "-vf", f"scale={width}:-2",
+            "-f", "image2pipe",
+            "-c:v", "ppm",
+            "pipe:1",
+        ]
+        frame = run_ffmpeg(command, timeout)
+
+        # Videos shorter than the seek position give no frame, so the start is tried then:
+        if frame:
+            return frame
+    raise RuntimeError(f"ffmpeg found no frames in {video_path}")
+
+
+def split_ppm_frames(data: bytes) -> list[bytes]:
+    """Split the output of ffmpeg with several binary PPM frames into separate images"""
+    frames = []
+    position = 0
+    while match := PPM_HEADER.match(data, position):
+        width, height = int(match.group(1)), int(match.group(2))
+        end = match.end() + width * height * 3
+        frames.append(data[position:end])
+        position = end
+    return frames
+
+
+def extract_frames(
+    video_path: str, width: int, count: int, timeout: float = FFMPEG_TIMEOUT
+) -> list[bytes]:
+    """Get frames sampled evenly from the start of the video, as binary PPM images"""
+    command = [
+        get_ffmpeg_binary(),
+        "-nostdin",
+        "-loglevel", "error",
+        "-t", str(PREVIEW_SPAN),
+        "-i", video_path,
+        "-an", "-sn",
+        "-vf", f"fps={count / PREVIEW_SPAN},scale={width}:-2",
+        "-frames:v", str(count),
+        "-f", "image2pipe",
+        "-c:v", "ppm",
+        "pipe:1",
+    ]
+    frames = split_ppm_frames(run_ffmpeg(command, timeout))
+    if not frames:
+        raise RuntimeError(f"ffmpeg found no frames in {video_path}")
+    return frames
@@ -0,0 +1,271 @@
+"""Module that watches image folders and reports files that were added, removed or modified"""
+
+import os
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable
+
+from waypaper.inventory import Inventory
+from waypaper.options import IMAGE_EXTENSIONS
+from waypaper.scanner import scan_folder, walk_folder
+
+# Flags of the inotify API, see inotify(7):
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+)
+EVENT_HEADER = struct.Struct("iIII")
+
+# Seconds to collect a burst of events before reporting them, and between polls:
+SETTLE_INTERVAL = 0.3
+POLL_INTERVAL = 2.0
+
+# Callback receives lists of added, removed and modified paths:
+ChangesCallback = Callable[[list[str], list[str], list[str]], None]
+
+
+class FolderWatcher(ABC):
+    """Keeps an inventory of files in the folders and reports changes to the callback"""
+
+    def __init__(
+        self,
+        folders: list[Path],
+        callback: ChangesCallback,
+        files: dict[str, tuple[int, int]] | None = None,
+        inventory: Inventory | None = None,
+    ) -> None:
+        self.folders = list(folders)
+        self.callback = callback
+        self.inventory = inventory
+        self.is_seeded = files is not None
+        self.files: dict[str, tuple[int, int]] = files or {}
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self) -> None:
+        """Take the initial inventory and start watching in a separate thread"""
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stop watching, the thread exits on its next wake up"""
+        self.stop_event.set()
+
+    @abstractmethod
+    def run(self) -> None: ...
+
+    def scan(self, folder: str) -> dict[str, tuple[int, int]]:
+        """Get size and modification time of every image under the folder"""
+        return {
+            entry.path: (entry.size, entry.mtime)
+            for entry in scan_folder(folder, IMAGE_EXTENSIONS, None, include_hidden=True)
+        }
+
+    def update(self, files: dict[str, tuple[int, int]]) -> None:
+        """Replace the inventory with a fresh scan and report the differences"""
+        old_files = self.files
+        added = [path for path in files if path not in old_files]
+        removed = [path for path in old_files if path not in files]
+        modified = [
+            path
+            for path, stat in files.items()
+            if path in old_files and old_files[path] != stat
+        ]
+        self.files = files
+        self.report(added, removed, modified)
+
+    def report(self, added: list[str], removed: list[str], modified: list[str]) -> None:
+        """Pass the changes to the callback if there are any"""
+        if added or removed or modified:
+            self.callback(added, removed, modified)
+
+
+class PollingWatcher(FolderWatcher):
+    """
+    Watcher that periodically rescans the folders, used when inotify is not available.
+    With an inventory, only directories whose mtime has changed are listed again, so
+    images rewritten in place are not noticed until their directory changes.
+    """
+
+    def run(self) -> None:
+        if not self.is_seeded:
+            self.files = self.scan_all()
+        while not self.stop_event.wait(POLL_INTERVAL):
+            self.update(self.scan_all())
+
+    def scan_all(self) -> dict[str, tuple[int, int]]:
+        if self.inventory is not None:
+            self.inventory.refresh(self.folders)
+            return self.inventory.get_files(self.folders)
+        files = {}
+        for folder in self.folders:
+            files.update(self.scan(str(folder)))
+        return files
+
+
+class InotifyWatcher(FolderWatcher):
+    """Watcher that receives changes from the kernel through inotify"""
+
+    def __init__(
+        self,
+        folders: list[Path],
+        callback: ChangesCallback,
+        files: dict[str, tuple[int, int]] | None = None,
+        inventory: Inventory | None = None,
+    ) -> None:
+        super().__init__(folders, callback, files, inventory)
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories: dict[int, str] = {}
+
+    def add_watches(self, folder: str) -> None:
+        """Watch the folder and all its subfolders"""
+        for root, _, _ in walk_folder(folder, include_hidden=True):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(root), WATCH_MASK)
+            if wd >= 0:
+                self.directories[wd] = root
+
+    def remove_watches(self, folder: str) -> None:
+        """Stop watching the folder and all its subfolders"""
+        prefix = os.path.join(folder, "")
+        for wd, root in list(self.directories.items()):
+            if root == folder or root.startswith(prefix):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.directories[wd]
+
+    def run(self) -> None:
+        for folder in self.folders:
+            self.add_watches(str(folder))
+            if not self.is_seeded:
+                self.files.update(self.scan(str(folder)))
+
+        added, removed, modified = set(), set(), set()
+        try:
+            while not self.stop_event.is_set():
+                # Report collected changes once the events settle down:
+                readable, _, _ = select.select([self.fd], [], [], SETTLE_INTERVAL)
+                if not readable:
+                    self.report(list(added), list(removed), list(modified))
+                    added, removed, modified = set(), set(), set()
+                    continue
+                for mask, path in self.read_events():
+                    self.handle_event(mask, path, added, removed, modified)
+        finally:
+            os.close(self.fd)
+
+    def read_events(self) -> list[tuple[int, str]]:
+        """Read pending events as pairs of mask and full path"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_IGNORED:
+                self.directories.pop(wd, None)
+                continue
+            if mask & IN_Q_OVERFLOW:
+                events.append((mask, ""))
+                continue
+            root = self.directories.get(wd)
+            if root is not None:
+                events.append((mask, os.path.join(root, os.fsdecode(name))))
+        return events
+
+    def handle_event(
+        self, mask: int, path: str, added: set, removed: set, modified: set
+    ) -> None:
+        """Update the inventory and the collected changes with a single event"""
+
+        # If the kernel dropped events, compare a fresh scan with the inventory:
+        if mask & IN_Q_OVERFLOW:
+            files = {}
+            for folder in self.folders:
+                files.update(self.scan(str(folder)))
+            self.update(files)
+            return
+
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self.add_watches(path)
+                files = self.scan(path)
+                self.files.update(files)
+                added.update(files)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self.remove_watches(path)
+                prefix = os.path.join(path, "")
+                for file in [f for f in self.files if f.startswith(prefix)]:
+                    del self.files[file]
+                    removed.add(file)
+                    added.discard(file)
+            return
+
+        if mask & (IN_DELETE | IN_MOVED_FROM):
+            if self.files.pop(path, None) is not None:
+                removed.add(path)
+                added.discard(path)
+                modified.discard(path)
+            return
+
+        # Only files that could be set as wallpapers are kept, like in a scan:
+        if os.path.splitext(path)[1].lower() not in IMAGE_EXTENSIONS:
+            return
+
+        # New regular files are reported once they are written, links right away:
+        if mask & IN_CREATE and not os.path.islink(path):
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        if path in self.files:
+            if path not in added:
+                modified.add(path)
+        else:
+            added.add(path)
+            removed.discard(path)
+        self.files[path] = (stat.st_size, stat.st_mtime_ns)
+
+
+def create_watcher(
+    folders: list[Path],
+    callback: ChangesCallback,
+    files: dict[str, tuple[int, int]] | None = None,
+    inventory: Inventory | None = None,
+) -> FolderWatcher:
+    """
+    Create an inotify watcher, or a polling one if inotify is not available.
+    If files are given, they are used as the initial inventory instead of a scan, and
+    the polling watcher checks folders through the persistent inventory if it is given.
+    """
+    try:
+        return InotifyWatcher(folders, callback, files, inventory)
+    except (OSError, AttributeError, TypeError):
+        return PollingWatcher(folders, callback, files, inventory)
@@ -1,24 +1,263 @@
 """
-This is a daemon that randomly changes wallpaper every specified number of minutes.
-THIS IS WORK IN PROGRESS AND NOT USED IN THE PROGRAM YET.
+This is a daemon that keeps the configuration, folder inventory and backend state in memory.
+It listens for JSON commands on a Unix socket, and can change wallpaper every given interval.
 """
 
-import time
 import os
+import json
+import time
 import argparse
+import threading
+import socketserver
+from pathlib import Path
+
+from waypaper.changer import change_wallpaper, change_wallpapers
+from waypaper.client import get_socket_path, send_command
+from waypaper.common import get_image_paths, get_random_file, get_next_random_files
+from waypaper.config import Config
+from waypaper.inventory import Inventory
+
+
+class WaypaperDaemon:
+    """Resident state of waypaper and the commands that can be run on it"""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.inventory = None
+        self.inventory_dir = None
+        self.load()
+
+    def load(self) -> None:
+        """Read the configuration and state files from the disk"""
+        self.cf = Config()
+        self.cf.read_state()
+        self.cf.check_validity()
+        self.file_times = self.get_file_times()
+
+        # The inventory stays in memory, unless the cache moved elsewhere:
+        if self.inventory is None or self.inventory_dir != self.cf.cache_dir:
+            self.inventory = Inventory(self.cf.cache_dir)
+            self.inventory_dir = self.cf.cache_dir
+
+    def get_file_times(self) -> tuple[int | None, int | None]:
+        """Get modification times of the configuration and state files"""
+        times = []
+        for path in (self.cf.config_file, self.cf.state_file):
+            try:
+                times.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                times.append(None)
+        return tuple(times)
+
+    def save(self) -> None:
+        """Save new wallpapers in the state or config file"""
+        if self.cf.use_xdg_state:
+            self.cf.save_state_file()
+        else:
+            self.cf.save()
+        self.file_times = self.get_file_times()
+
+    def handle(self, request: dict) -> dict:
+        """Run the requested command and return the reply"""
+        commands = {
+            "set": self.set_wallpaper,
+            "random": self.set_random_wallpaper,
+            "next": self.set_next_wallpaper,
+            "restore": self.restore,
+            "list": self.list,
+            "reload": self.reload,
+        }
+        arguments = dict(request)
+        command = commands.get(arguments.pop("command", None))
+        if command is None:
+            return {"status": "error", "message": f"Unknown command: {request}"}
+        try:
+            with self.lock:
+                # The GUI and the CLI write the same files, so changes since the last
+                # command are read first, not to overwrite them with a stale copy:
+                if self.get_file_times() != self.file_times:
+                    self.load()
+                return {"status": "ok", **command(**arguments)}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def set_wallpaper(self, wallpaper: str, monitor: str = "All") -> dict:
+        """Set the wallpaper on the monitor and remember it"""
+        wallpaper_path = Path(wallpaper).expanduser()
+        if not wallpaper_path.exists():
+            raise FileNotFoundError(f"Wallpaper not found: {wallpaper}")
+        if not change_wallpaper(wallpaper_path, self.cf, monitor):
+            raise RuntimeError(f"Could not set {wallpaper} on {monitor}")
+        self.cf.selected_wallpaper = wallpaper_path
+        self.cf.selected_monitor = monitor
+        self.cf.attribute_selected_wallpaper()
+        self.save()
+        return self.list()
+
+    def get_random_wallpaper(self) -> Path:
+        wallpaper = get_random_file(
+            self.cf.backend,
+            self.cf.image_folder_list,
+            self.cf.include_subfolders,
+            self.cf.include_all_subfolders,
+            self.cf.cache_dir,
+            self.cf.show_hidden,
+            self.inventory,
+        )
+        if not wallpaper:
+            raise FileNotFoundError("Could not get random wallpaper")
+        return Path(wallpaper)
+
+    def set_random_wallpaper(self, monitor: str | None = None) -> dict:
+        """Set a random wallpaper on the monitor, or on every known monitor"""
+        if monitor:
+            return self.set_wallpaper(str(self.get_random_wallpaper()), monitor)
+        changes = [(self.get_random_wallpaper(), name) for name in self.cf.monitors]
+
+        # With hyprpaper, decode the images of the next random change in advance:
+        preload = []
+        if self.cf.backend == "hyprpaper" and self.cf.hyprpaper_preload_ahead:
+            next_files = get_next_random_files(self.cf.cache_dir, len(changes))
+            preload = [Path(path) for path in next_files]
+        return self.apply(changes, preload)
+
+    def apply(self, changes: list[tuple[Path, str]], preload: list[Path] | None = None) -> dict:
+        """Set wallpapers on monitors in parallel, and remember those that were set"""
+        results = change_wallpapers(changes, self.cf, preload)
+        for result in results:
+            if not result.success:
+                continue
+            index = self.cf.monitors.index(result.monitor)
+            if index < len(self.cf.wallpapers):
+                self.cf.wallpapers[index] = result.wallpaper
+            else:
+                self.cf.wallpapers.append(result.wallpaper)
+        if any(result.success for result in results):
+            self.save()
+        reply = self.list()
+        reply["results"] = [
+            {"monitor": r.monitor, "success": r.success, "seconds": r.seconds}
+            for r in results
+        ]
+        return reply
+
+    def set_next_wallpaper(self, monitor: str | None = None) -> dict:
+        """Set the image that follows the current wallpaper in the sorted folder"""
+        image_paths = sorted(
+            get_image_paths(
+                self.cf.backend,
+                self.cf.image_folder_list,
+                self.cf.include_subfolders,
+                self.cf.include_all_subfolders,
+                self.cf.show_hidden,
+                self.cf.show_gifs_only,
+                self.inventory,
+            )
+        )
+        if not image_paths:
+            raise FileNotFoundError("No wallpapers found in the folders")
+        positions = {path: index for index, path in enumerate(image_paths)}
+
+        changes = []
+        for wallpaper, monitor_name in zip(self.cf.wallpapers, self.cf.monitors):
+            if monitor and monitor_name != monitor:
+                continue
+            position = positions.get(str(wallpaper), -1)
+            next_wallpaper = Path(image_paths[(position + 1) % len(image_paths)])
+            changes.append((next_wallpaper, monitor_name))
+        return self.apply(changes)
+
+    def restore(self) -> dict:
+        """Set the remembered wallpapers again"""
+        changes = [
+            (wallpaper, monitor)
+            for wallpaper, monitor in zip(self.cf.wallpapers, self.cf.monitors)
+            if wallpaper is not None
+        ]
+        return self.apply(changes)
+
+    def list(self) -> dict:
+        """Describe wallpapers that are set on each monitor"""
+        backend = self.cf.backend
+        wallpapers = [
+            {"monitor": monitor, "wallpaper": str(wallpaper), "backend": str(backend)}
+            for monitor, wallpaper in zip(self.cf.monitors, self.cf.wallpapers)
+        ]
+        return {"wallpapers": wallpapers}
+
+    def reload(self) -> dict:
+        """Read the configuration again, for example after it was edited by the GUI"""
+        self.load()
+        return self.list()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Reads one JSON command per line and writes one JSON reply per line"""
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                reply = self.server.waypaper.handle(request)
+            except json.JSONDecodeError as e:
+                reply = {"status": "error", "message": f"Invalid request: {e}"}
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+            self.wfile.flush()
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, daemon: WaypaperDaemon) -> None:
+        self.waypaper = daemon
+        super().__init__(str(socket_path), RequestHandler)
+
+
+def change_periodically(daemon: WaypaperDaemon, interval: int) -> None:
+    """Set a random wallpaper every interval seconds"""
+    while True:
+        time.sleep(interval)
+        reply = daemon.handle({"command": "random"})
+        print(f"Random wallpaper: {reply['status']}. Waiting {interval} seconds.")
+
 
 def main():
-    parser = argparse.ArgumentParser(description="Randomly changes wallpaper every specified number of seconds.")
-    parser.add_argument("interval", type=int, help="Time interval in seconds until next wallpaper change.")
+    parser = argparse.ArgumentParser(
+        description="Keep waypaper running and accept commands on a Unix socket."
+    )
+    parser.add_argument(
+        "interval",
+        type=int,
+        nargs="?",
+        default=0,
+        help="Time interval in seconds until next random wallpaper, 0 to disable.",
+    )
     args = parser.parse_args()
 
-    try:
-        while True:
-            os.system("waypaper --random")
-            print(f"Command to change wallpaper executed. Waiting {args.interval} seconds.")
-            time.sleep(args.interval)
-    except KeyboardInterrupt:
-        print("Program interrupted. Exiting.")
+    # Do not start a second daemon, but clean up a socket left by a crashed one:
+    socket_path = get_socket_path()
+    if send_command("list", timeout=1.0) is not None:
+        print(f"waypaperd is already running on {socket_path}")
+        return
+    if socket_path.exists():
+        socket_path.unlink()
+
+    daemon = WaypaperDaemon()
+    if args.interval > 0:
+        threading.Thread(
+            target=change_periodically, args=(daemon, args.interval), daemon=True
+        ).start()
+
+    with DaemonServer(socket_path, daemon) as server:
+        os.chmod(socket_path, 0o600)
+        print(f"waypaperd is listening on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("Program interrupted. Exiting.")
+        finally:
+            socket_path.unlink(missing_ok=True)
+
 
 if __name__ == "__main__":
     main()